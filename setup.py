@@ -10,12 +10,13 @@ setup(
     version='1.0.2',
     packages=['torpeewee'],
     install_requires=[
-        'peewee>=3.14.4'
+        'peewee>=3.14.4',
+        'contextvars; python_version < "3.7"'
     ],
     extras_require={
         'tornado': ['tornado>=5.0'],
         'tormysql': ['tormysql>=0.3.8'],
-        'asyncpg': ['aiopg>=0.14.0'],
+        'asyncpg': ['aiopg>=0.14.0', 'asyncpg>=0.24.0'],
     },
     author='snower',
     author_email='sujian199@gmail.com',
@@ -13,7 +13,8 @@ if os.getenv("TEST_DRIVER", "mysql") == "mysql":
         passwd=os.getenv("MYSQL_PASSWD", ""),
         charset=os.getenv("MYSQL_CHARSET", "utf8"),
         sql_mode="REAL_AS_FLOAT",
-        init_command="SET max_join_size=DEFAULT"
+        init_command="SET max_join_size=DEFAULT",
+        local_infile=True
     )
 
     db = MySQLDatabase(
@@ -30,10 +31,16 @@ else:
         passwd=os.getenv("POSTGRESQL_PASSWD", ""),
     )
 
-    db = PostgresqlDatabase(
-        os.getenv("POSTGRESQL_DB", "test"),
-        **PARAMS
-    )
+    if os.getenv("TEST_DRIVER") == "asyncpg":
+        db = AsyncpgDatabase(
+            os.getenv("POSTGRESQL_DB", "test"),
+            **PARAMS
+        )
+    else:
+        db = PostgresqlDatabase(
+            os.getenv("POSTGRESQL_DB", "test"),
+            **PARAMS
+        )
 
 class Test(Model):
     id = IntegerField(primary_key=True)
@@ -53,4 +60,36 @@ class TestTableModel(Model):
     updated_at = DateTimeField()
 
     class Meta:
-        database = db
\ No newline at end of file
+        database = db
+
+
+class TestRelatedModel(Model):
+    id = IntegerField(primary_key=True)
+    test = ForeignKeyField(Test, backref="related")
+    data = CharField(max_length=64, null=False)
+
+    class Meta:
+        database = db
+
+
+class TestLevelModelA(Model):
+    id = IntegerField(primary_key=True)
+
+    class Meta:
+        database = db
+
+
+class TestLevelModelB(Model):
+    id = IntegerField(primary_key=True)
+    level_a = ForeignKeyField(TestLevelModelA)
+
+    class Meta:
+        database = db
+
+
+class TestLevelModelC(Model):
+    id = IntegerField(primary_key=True)
+    level_b = ForeignKeyField(TestLevelModelB)
+
+    class Meta:
+        database = db
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+from tornado.testing import gen_test
+from torpeewee import MySQLDatabase, PostgresqlDatabase
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+
+class TestAutocommitTestCase(BaseTestCase):
+    @gen_test(timeout=60)
+    async def test(self):
+        if isinstance(db, MySQLDatabase):
+            autocommit_db = MySQLDatabase(db.database, autocommit=True, max_connections=1, **PARAMS)
+        else:
+            autocommit_db = PostgresqlDatabase(db.database, autocommit=True, maxsize=1, **PARAMS)
+
+        await Test.delete()
+        await Test.create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        await Test.use(autocommit_db).update(data="autocommit").where(Test.id == 1)
+        t = await Test.select().where(Test.id == 1).first()
+        assert t.data == "autocommit", ''
+
+        async with await autocommit_db.transaction() as transaction:
+            await Test.use(transaction).update(data="transaction").where(Test.id == 1)
+            t = await Test.select().where(Test.id == 1).first()
+            assert t.data == "autocommit", ''
+
+        t = await Test.use(autocommit_db).select().where(Test.id == 1).first()
+        assert t.data == "transaction", ''
+
+        commits = db.pool_stats()["commits"]
+        for i in range(5):
+            await Test.update(count=i).where(Test.id == 1)
+        assert db.pool_stats()["commits"] == commits + 5, ''
+
+        commits, queries = autocommit_db.pool_stats()["commits"], autocommit_db.pool_stats()["queries"]
+        for i in range(5):
+            await Test.use(autocommit_db).update(count=i).where(Test.id == 1)
+            t = await Test.use(autocommit_db).select().where(Test.id == 1).first()
+            assert t.count == i, ''
+        assert autocommit_db.pool_stats()["commits"] == commits, ''
+        assert autocommit_db.pool_stats()["queries"] == queries + 10, ''
+
+        await Test.delete()
+        autocommit_db.close()
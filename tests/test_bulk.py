@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import warnings
+import datetime
+from tornado.testing import gen_test
+from torpeewee import PostgresqlDatabase
+from . import BaseTestCase
+from .model import Test, db
+
+
+async def iter_rows(count):
+    now = datetime.datetime.now()
+    for i in range(1, count + 1):
+        yield {"id": i, "data": "bulk", "count": i, "created_at": now, "updated_at": now}
+
+
+class TestBulkTestCase(BaseTestCase):
+    @gen_test(timeout=30)
+    async def test_bulk_insert(self):
+        await Test.delete()
+
+        result = await Test.bulk_insert(iter_rows(250), batch_size=100, concurrency=2)
+        assert result.rows == 250 and result.batches == 3, ''
+        assert result.rows_per_second > 0, ''
+        c = await Test.select().count()
+        assert c == 250, ''
+
+        await Test.delete()
+        now = datetime.datetime.now()
+        rows = [(i, "bulk", now, now) for i in range(1, 101)]
+        result = await Test.bulk_insert(rows, fields=[Test.id, Test.data, Test.created_at, Test.updated_at],
+                                        batch_size=30, atomic=True)
+        assert result.batches == 4, ''
+        c = await Test.select().count()
+        assert c == 100, ''
+
+        await Test.delete()
+
+    @gen_test(timeout=30)
+    async def test_copy_from(self):
+        await Test.delete()
+
+        result = await Test.copy_from(iter_rows(250), batch_size=100)
+        assert result.rows == 250, ''
+        c = await Test.select().count()
+        assert c == 250, ''
+
+        t = await Test.select().where(Test.id == 10).first()
+        assert t.data == "bulk" and t.count == 10, ''
+
+        await Test.delete()
+        if isinstance(db, PostgresqlDatabase):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                await Test.copy_from(iter_rows(1))
+            assert any(issubclass(warning.category, RuntimeWarning) for warning in caught), ''
+            await Test.delete()
+
+    @gen_test(timeout=30)
+    async def test_bulk_update(self):
+        await Test.delete()
+        await Test.bulk_insert(iter_rows(10))
+
+        tests = [t for t in (await Test.select().order_by(Test.id))]
+        for t in tests[:5]:
+            t.data = "updated%d" % t.id
+        for t in tests[5:]:
+            t.count = 100
+        c = await Test.bulk_update(tests, batch_size=3)
+        assert c == 10, ''
+
+        t = await Test.select().where(Test.id == 2).first()
+        assert t.data == "updated2" and t.count == 2, ''
+        t = await Test.select().where(Test.id == 8).first()
+        assert t.data == "bulk" and t.count == 100, ''
+
+        await Test.delete()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import datetime
+from tornado.testing import gen_test
+from torpeewee import QueryCache, LRUCacheBackend
+from . import BaseTestCase
+from .model import Test, db
+
+
+class TestCacheTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        cache = QueryCache(LRUCacheBackend(max_size=16))
+
+        await Test.delete()
+        await Test.create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        queries = db.pool_stats()["queries"]
+        results = await asyncio.gather(*[Test.select().where(Test.id == 1).cached(60, cache).first() for _ in range(5)])
+        assert all(t.data == "test" for t in results), ''
+        assert db.pool_stats()["queries"] == queries + 1, ''
+
+        t = await Test.select().where(Test.id == 1).cached(60, cache).first()
+        assert t.data == "test", ''
+        c = await Test.select().cached(60, cache).count()
+        assert c == 1, ''
+        assert db.pool_stats()["queries"] == queries + 2, ''
+        assert cache.stats.hits == 1 and cache.stats.coalesced == 4, ''
+
+        await Test.update(data="cached").where(Test.id == 1)
+        t = await Test.select().where(Test.id == 1).cached(60, cache).first()
+        assert t.data == "cached", ''
+        c = await Test.select().cached(60, cache).count()
+        assert c == 1, ''
+        assert db.pool_stats()["queries"] == queries + 5, ''
+
+        await Test.delete()
+
+    @gen_test
+    async def test_transaction(self):
+        cache = QueryCache(LRUCacheBackend(max_size=16))
+
+        await Test.delete()
+        await Test.create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        t = await Test.select().where(Test.id == 1).cached(60, cache).first()
+        assert t.data == "test", ''
+
+        async with await db.transaction() as transaction:
+            await Test.use(transaction).update(data="uncommitted").where(Test.id == 1)
+            t = await Test.use(transaction).select().where(Test.id == 1).cached(60, cache).first()
+            assert t.data == "uncommitted", ''
+            t = await Test.select().where(Test.id == 1).cached(60, cache).first()
+            assert t.data == "test", ''
+
+        t = await Test.select().where(Test.id == 1).cached(60, cache).first()
+        assert t.data == "uncommitted", ''
+        other_db = type(db)(db.database, host="127.0.0.2")
+        assert cache.cache_key(db, "SELECT 1", ()) != cache.cache_key(other_db, "SELECT 1", ()), ''
+
+        await Test.delete()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import datetime
+from tornado.testing import gen_test
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+
+class TestCoalesceTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        coalesce_db = type(db)(db.database, coalesce_selects=True, **PARAMS)
+
+        await Test.delete()
+        await Test.create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        results = await asyncio.gather(*[Test.use(coalesce_db).select().where(Test.id == 1).first() for _ in range(50)])
+        assert all(t.data == "test" for t in results), ''
+        assert len(set(id(t) for t in results)) == 50, ''
+        assert coalesce_db.pool_stats()["queries"] == 1, ''
+
+        results = await asyncio.gather(*[Test.use(coalesce_db).select().where(Test.id == 1).coalesce(False).first()
+                                         for _ in range(5)])
+        assert all(t.data == "test" for t in results), ''
+        assert coalesce_db.pool_stats()["queries"] == 6, ''
+
+        tasks = [asyncio.ensure_future(Test.use(coalesce_db).select().where(Test.id == 1).first()) for _ in range(5)]
+        await asyncio.sleep(0)
+        tasks[0].cancel()
+        results = await asyncio.gather(*tasks[1:])
+        assert all(t.data == "test" for t in results), ''
+        assert tasks[0].cancelled(), ''
+        assert coalesce_db.pool_stats()["queries"] == 7, ''
+
+        queries = db.pool_stats()["queries"]
+        results = await asyncio.gather(*[Test.select().where(Test.id == 1).coalesce().count() for _ in range(10)])
+        assert results == [1] * 10, ''
+        assert db.pool_stats()["queries"] == queries + 1, ''
+
+        await Test.delete()
+        coalesce_db.close()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import datetime
+from tornado.testing import gen_test
+from torpeewee import MySQLDatabase
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+if isinstance(db, MySQLDatabase):
+    PID_SQL, KILL_SQL = "SELECT CONNECTION_ID()", "KILL %s"
+else:
+    PID_SQL, KILL_SQL = "SELECT pg_backend_pid()", "SELECT pg_terminate_backend(%s)"
+
+
+class TestHealthTestCase(BaseTestCase):
+    @gen_test(timeout=30)
+    async def test(self):
+        health_db = type(db)(db.database, health_check_interval=0.1, max_lifetime=1, **PARAMS)
+        try:
+            assert (await health_db.warmup(3)) == 3, ''
+            stats = health_db.pool_stats()
+            assert stats["size"] >= 3 and stats["idle"] >= 3, ''
+            assert stats["in_use"] == 0, ''
+            acquires = stats["acquires"]
+
+            await asyncio.sleep(0.5)
+            stats = health_db.pool_stats()
+            assert stats["pings"] >= 3 and stats["ping_failures"] == 0, ''
+            assert stats["acquires"] == acquires, ''
+
+            await asyncio.sleep(1.5)
+            assert health_db.pool_stats()["recycled"] >= 1, ''
+
+            await Test.delete()
+            await Test.use(health_db).create(data="health", created_at=datetime.datetime.now(),
+                                             updated_at=datetime.datetime.now())
+            assert (await Test.use(health_db).select().count()) == 1, ''
+            assert health_db.pool_stats()["in_use"] == 0, ''
+        finally:
+            health_db.close()
+
+    @gen_test(timeout=30)
+    async def test_read_retry(self):
+        if isinstance(db, MySQLDatabase):
+            retry_db = MySQLDatabase(db.database, max_connections=1, **PARAMS)
+        else:
+            retry_db = type(db)(db.database, maxsize=1, **PARAMS)
+        try:
+            pid = (await retry_db.execute_sql(PID_SQL)).fetchone()[0]
+            await db.execute_sql(KILL_SQL, (pid,))
+            await asyncio.sleep(0.1)
+
+            assert (await retry_db.execute_sql(PID_SQL)).fetchone()[0] != pid, ''
+            stats = retry_db.pool_stats()
+            assert stats["read_retries"] == 1 and stats["in_use"] == 0, ''
+            assert (await retry_db.execute_sql(PID_SQL)).fetchone()[0] != pid, ''
+        finally:
+            retry_db.close()
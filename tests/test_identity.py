@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+from tornado.testing import gen_test
+from torpeewee import IdentityMap
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+
+class TestIdentityTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        await Test.delete()
+        await Test.create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+        await Test.create(id=2, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+        other_db = type(db)(db.database, **PARAMS)
+
+        async with IdentityMap() as identity_map:
+            queries = db.pool_stats()["queries"]
+            t1 = await Test.get_by_id(1)
+            t2 = await Test.get(Test.id == 1)
+            t3 = await Test.get_or_none(Test.id == 1)
+            assert t1 is t2 and t2 is t3, ''
+            assert db.pool_stats()["queries"] == queries + 1, ''
+            assert identity_map.hits == 2, ''
+
+            t2 = await Test.get_by_id(2)
+            other_t1 = await Test.use(other_db).select().where(Test.id == 1).get()
+            assert other_t1 is not t1 and identity_map.get(Test, 1, other_db) is other_t1, ''
+
+            t1.data = "identity"
+            await t1.save()
+            assert (await Test.get_by_id(1)) is t1, ''
+            assert (await Test.get_by_id(2)) is t2, ''
+
+            await Test.update(data="updated").where(Test.id == 1)
+            t = await Test.get_by_id(1)
+            assert t is not t1 and t.data == "updated", ''
+
+        assert len(identity_map) == 0, ''
+        t = await Test.get_by_id(1)
+        assert t.data == "updated", ''
+
+        await Test.delete()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import datetime
+from tornado.testing import gen_test
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+
+class TestImplicitTransactionTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        implicit_db = type(db)(db.database, implicit_transactions=True, **PARAMS)
+
+        await Test.delete()
+        await Test.create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        async with await implicit_db.transaction():
+            assert implicit_db.in_transaction(), ''
+            acquires = implicit_db.pool_stats()["acquires"]
+            t = await Test.use(implicit_db).get_by_id(1)
+            t.data = "implicit"
+            await t.use(implicit_db).save()
+            assert (await Test.use(implicit_db).select().where(Test.data == "implicit").count()) == 1, ''
+            assert (await Test.select().where(Test.data == "implicit").count()) == 0, ''
+
+            try:
+                async with implicit_db.atomic():
+                    await Test.use(implicit_db).update(data="rollback").where(Test.id == 1)
+                    raise ValueError()
+            except ValueError:
+                pass
+            assert (await Test.use(implicit_db).get_by_id(1)).data == "implicit", ''
+            assert implicit_db.pool_stats()["acquires"] == acquires, ''
+
+        assert not implicit_db.in_transaction(), ''
+        assert (await Test.get_by_id(1)).data == "implicit", ''
+
+        try:
+            async with await implicit_db.transaction():
+                await Test.use(implicit_db).update(data="rollback").where(Test.id == 1)
+                raise ValueError()
+        except ValueError:
+            pass
+        assert (await Test.use(implicit_db).get_by_id(1)).data == "implicit", ''
+
+        try:
+            async with implicit_db.atomic():
+                assert implicit_db.in_transaction(), ''
+                await Test.use(implicit_db).create(data="atomic", created_at=datetime.datetime.now(),
+                                                   updated_at=datetime.datetime.now())
+                assert (await Test.use(implicit_db).select().where(Test.data == "atomic").count()) == 1, ''
+                assert (await Test.select().where(Test.data == "atomic").count()) == 0, ''
+                raise ValueError()
+        except ValueError:
+            pass
+        assert (await Test.select().where(Test.data == "atomic").count()) == 0, ''
+
+        async with implicit_db.atomic():
+            acquires = implicit_db.pool_stats()["acquires"]
+            counts = await asyncio.gather(*[Test.use(implicit_db).select().count() for _ in range(10)])
+            assert counts == [1] * 10, ''
+            assert implicit_db.pool_stats()["acquires"] == acquires, ''
+        implicit_db.close()
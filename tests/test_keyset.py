@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+from tornado.testing import gen_test
+from torpeewee import CharField
+from torpeewee.keyset import encode_token, decode_token
+from . import BaseTestCase
+from .model import Test
+
+
+class NullableTest(Test):
+    data = CharField(max_length=64, null=True)
+
+    class Meta:
+        table_name = "test"
+
+
+class TestKeysetTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        await Test.delete()
+        now = datetime.datetime.now().replace(microsecond=0)
+        for i in range(1, 11):
+            await Test.create(id=i, data="test", count=i % 3, created_at=now, updated_at=now)
+
+        rows, token = await Test.select().keyset_paginate(limit=4)
+        assert [t.id for t in rows] == [1, 2, 3, 4] and token, ''
+        rows, token = await Test.select().keyset_paginate(after=token, limit=4)
+        assert [t.id for t in rows] == [5, 6, 7, 8] and token, ''
+        rows, token = await Test.select().keyset_paginate(after=token, limit=4)
+        assert [t.id for t in rows] == [9, 10] and token is None, ''
+
+        ids = [t.id async for t in Test.select().where(Test.id > 1).iter_keyset(3, order_by=(Test.count.desc(),))]
+        assert ids == [2, 5, 8, 4, 7, 10, 3, 6, 9], ''
+
+        rows, token = await Test.select(Test.count, Test.id).tuples().keyset_paginate(limit=4, order_by=(Test.count,))
+        assert rows == [(0, 3), (0, 6), (0, 9), (1, 1)] and token, ''
+        rows, token = await Test.select(Test.count, Test.id).tuples().keyset_paginate(after=token, limit=4,
+                                                                                      order_by=(Test.count,))
+        assert rows == [(1, 4), (1, 7), (1, 10), (2, 2)] and token, ''
+
+        try:
+            await Test.select().keyset_paginate(after="invalid", limit=4)
+        except ValueError:
+            pass
+        else:
+            assert False, ''
+
+        try:
+            await NullableTest.select().keyset_paginate(limit=4, order_by=(NullableTest.data,))
+        except ValueError:
+            pass
+        else:
+            assert False, ''
+
+        values = [now.replace(microsecond=123456), now.date(), now.time(),
+                  now.replace(tzinfo=datetime.timezone(datetime.timedelta(hours=8)))]
+        assert decode_token(encode_token(values)) == values, ''
+
+        await Test.delete()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import datetime
+from tornado.testing import gen_test
+from torpeewee import IdentityMap
+from . import BaseTestCase
+from .model import Test, db
+
+
+class TestLoaderTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        await Test.delete()
+        for i in range(1, 6):
+            await Test.create(id=i, data="test%d" % i, created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        queries = db.pool_stats()["queries"]
+        results = await asyncio.gather(*[Test.load(i) for i in range(1, 11)])
+        assert [t.data if t else None for t in results] == ["test%d" % i for i in range(1, 6)] + [None] * 5, ''
+        assert db.pool_stats()["queries"] == queries + 1, ''
+
+        results = await Test.load_many(["test2", "test9"], field="data")
+        assert results[0].id == 2 and results[1] is None, ''
+
+        async with IdentityMap() as identity_map:
+            results = await asyncio.gather(*[Test.load(i) for i in (1, 2)])
+            assert identity_map.get(Test, 1) is results[0] and identity_map.get(Test, 2) is results[1], ''
+
+        async with await db.transaction() as transaction:
+            await Test.use(transaction).update(data="uncommitted").where(Test.id == 1)
+            results = await asyncio.gather(Test.use(transaction).load(1), Test.load(1))
+            assert results[0].data == "uncommitted" and results[1].data == "test1", ''
+
+        await Test.delete()
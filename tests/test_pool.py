@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+from tornado.testing import gen_test
+from . import BaseTestCase
+from .model import Test, db
+
+
+class TestPoolTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        events = {"acquire": 0, "release": 0, "query": 0, "error": 0}
+
+        def on_acquire(conn, wait_time):
+            events["acquire"] += 1
+
+        def on_release(conn, checkout_time):
+            events["release"] += 1
+
+        def on_query(sql, params, query_time, rows):
+            events["query"] += 1
+
+        def on_error(sql, params, exc):
+            events["error"] += 1
+
+        def on_broken_query(sql, params, query_time, rows):
+            raise ValueError()
+
+        db.add_hook("acquire", on_acquire)
+        db.add_hook("release", on_release)
+        db.add_hook("query", on_broken_query)
+        db.add_hook("query", on_query)
+        db.add_hook("error", on_error)
+        try:
+            await Test.delete()
+            await Test.create(data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+            count = await Test.select().count()
+            assert count == 1, ''
+
+            try:
+                await db.execute_sql("SELECT * FROM torpeewee_not_exists_table")
+            except Exception:
+                pass
+            else:
+                assert False, ''
+
+            stats = db.pool_stats()
+            assert stats["size"] >= 1, ''
+            assert stats["max_size"] >= stats["size"], ''
+            assert stats["in_use"] == 0, ''
+            assert stats["acquires"] >= 4 and stats["acquires"] == stats["releases"], ''
+            assert stats["queries"] >= 3 and stats["errors"] >= 1, ''
+            assert events["acquire"] >= 4 and events["acquire"] == events["release"], ''
+            assert events["query"] >= 3 and events["error"] == 1, ''
+        finally:
+            db.remove_hook("acquire", on_acquire)
+            db.remove_hook("release", on_release)
+            db.remove_hook("query", on_broken_query)
+            db.remove_hook("query", on_query)
+            db.remove_hook("error", on_error)
+
+        await Test.delete()
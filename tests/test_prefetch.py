@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+from tornado.testing import gen_test
+from torpeewee import prefetch
+from . import BaseTestCase
+from .model import Test, TestRelatedModel, db, PARAMS
+
+
+class TestPrefetchTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        await TestRelatedModel.drop_table()
+        await Test.delete()
+        await TestRelatedModel.create_table()
+        try:
+            for i in (1, 2):
+                await Test.create(id=i, data="test%d" % i, created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+            for i, test_id in ((1, 1), (2, 1), (3, 2)):
+                await TestRelatedModel.create(id=i, test=test_id, data="related%d" % i)
+
+            tests = await Test.select().order_by(Test.id).prefetch(TestRelatedModel)
+            assert [[r.data for r in t.related] for t in tests] == [["related1", "related2"], ["related3"]], ''
+            assert tests[0].related[0].test is tests[0], ''
+
+            other_db = type(db)(db.database, **PARAMS)
+            tests = await Test.select().order_by(Test.id).prefetch(TestRelatedModel.use(other_db).select())
+            assert [[r.data for r in t.related] for t in tests] == [["related1", "related2"], ["related3"]], ''
+            assert other_db.pool_stats()["queries"] == 1, ''
+            other_db.close()
+
+            related = await prefetch(TestRelatedModel.select().order_by(TestRelatedModel.id), Test)
+            assert [r.test.data for r in related] == ["test1", "test1", "test2"], ''
+        finally:
+            await TestRelatedModel.drop_table()
+            await Test.delete()
@@ -2,10 +2,12 @@
 # 16/7/11
 # create by: snower
 
+import asyncio
 import datetime
 from tornado.testing import gen_test
+from torpeewee import PostgresqlDatabase
 from . import BaseTestCase
-from .model import Test
+from .model import Test, db
 
 class TestQueryTestCase(BaseTestCase):
     @gen_test
@@ -55,4 +57,69 @@ class TestQueryTestCase(BaseTestCase):
 
         await Test.delete()
         c = await Test.select().count()
-        assert c == 0, ''
\ No newline at end of file
+        assert c == 0, ''
+
+    @gen_test
+    async def test_stream(self):
+        await Test.delete()
+
+        for i in range(1, 6):
+            await Test.create(id=i, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        data = []
+        async for i in Test.select().order_by(Test.id).stream(batch_size=2):
+            data.append(i.id)
+        assert data == [1, 2, 3, 4, 5], ''
+
+        async with Test.select().order_by(Test.id).tuples().stream(batch_size=2) as rows:
+            async for i in rows:
+                assert i[0] == 1
+                break
+
+        c = await Test.select().count()
+        assert c == 5, ''
+
+        async with await db.transaction() as transaction:
+            data = []
+            counting = asyncio.ensure_future(Test.use(transaction).select().count())
+            async for i in Test.use(transaction).select().order_by(Test.id).stream(batch_size=2):
+                data.append(i.id)
+                await asyncio.sleep(0)
+            assert data == [1, 2, 3, 4, 5], ''
+            assert (await counting) == 5, ''
+
+            async for i in Test.use(transaction).select().order_by(Test.id).stream(batch_size=2):
+                break
+            stream = Test.use(transaction).select().order_by(Test.id).stream(batch_size=2)
+            async with stream:
+                async for i in stream:
+                    assert i.id == 1
+                    break
+            if isinstance(db, PostgresqlDatabase):
+                cursors = (await transaction.execute_sql("SELECT COUNT(*) FROM pg_cursors")).fetchone()[0]
+                assert cursors <= 1, ''
+            c = await Test.use(transaction).select().count()
+            assert c == 5, ''
+
+        await Test.delete()
+
+    @gen_test
+    async def test_compile(self):
+        await Test.delete()
+
+        await Test.create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+        await Test.create(id=2, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        select_query = Test.select().where(Test.id == Param('id')).compile()
+        for i in (1, 2):
+            data = [t for t in (await select_query(id=i))]
+            assert len(data) == 1 and data[0].id == i, ''
+
+        update_query = Test.update(data=Param('data')).where(Test.id == Param('id')).compile()
+        c = await update_query(data='compiled', id=2)
+        assert c == 1, ''
+
+        t = await Test.select().where(Test.id == 2).first()
+        assert t.data == 'compiled', ''
+
+        await Test.delete()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import datetime
+from tornado.testing import gen_test
+from . import BaseTestCase
+from .model import Test, TestRelatedModel, db
+
+
+class TestRelatedTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        await TestRelatedModel.drop_table()
+        await Test.delete()
+        await TestRelatedModel.create_table()
+        try:
+            for i in (1, 2):
+                await Test.create(id=i, data="test%d" % i, created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+            for i, test_id in ((1, 1), (2, 1), (3, 2)):
+                await TestRelatedModel.create(id=i, test=test_id, data="related%d" % i)
+
+            related = await TestRelatedModel.select().order_by(TestRelatedModel.id)
+            queries = db.pool_stats()["queries"]
+            tests = await asyncio.gather(*[r.fetch_related("test") for r in related])
+            assert [t.data for t in tests] == ["test1", "test1", "test2"], ''
+            assert db.pool_stats()["queries"] == queries + 1, ''
+            assert related[0].test.data == "test1", ''
+
+            r = await TestRelatedModel.get_by_id(3)
+            t = await r.test
+            assert t.id == 2 and r.test is t, ''
+
+            tests = await Test.select().order_by(Test.id)
+            queries = db.pool_stats()["queries"]
+            await asyncio.gather(*[t.fetch_related("related") for t in tests])
+            assert db.pool_stats()["queries"] == queries + 1, ''
+            assert sorted(r.data for r in tests[0].related) == ["related1", "related2"], ''
+            assert [r.data async for r in tests[1].related] == ["related3"], ''
+        finally:
+            await TestRelatedModel.drop_table()
+            await Test.delete()
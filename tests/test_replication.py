@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import datetime
+from tornado.testing import gen_test
+from torpeewee import ReplicatedDatabase
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+
+class TestReplicationTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        replica = type(db)(db.database, **PARAMS)
+        replicated = ReplicatedDatabase(db, [replica], balance="least_outstanding", sticky_time=60)
+
+        await Test.delete()
+        t = await Test.use(replicated).create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+        assert t.id == 1, ''
+        assert replica.pool_stats()["queries"] == 0, ''
+
+        t = await Test.use(replicated).select().where(Test.id == 1).first()
+        assert t.data == "test", ''
+        assert replica.pool_stats()["queries"] == 0, ''
+
+        async def read():
+            return await Test.use(replicated).select().where(Test.id == 1).first()
+
+        t = await asyncio.ensure_future(read())
+        assert t.data == "test", ''
+        assert replica.pool_stats()["queries"] == 1, ''
+
+        async def read_for_update():
+            return await Test.use(replicated).select().where(Test.id == 1).for_update().first()
+
+        t = await asyncio.ensure_future(read_for_update())
+        assert t.data == "test", ''
+        assert replica.pool_stats()["queries"] == 1, ''
+
+        await Test.delete()
+        replica.close()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+from tornado.testing import gen_test
+from torpeewee import MySQLDatabase
+from . import BaseTestCase
+from .model import Test, db
+
+
+def conflict_error():
+    if isinstance(db, MySQLDatabase):
+        from pymysql.err import OperationalError
+        return OperationalError(1213, "Deadlock found when trying to get lock")
+    error = Exception("could not serialize access due to concurrent update")
+    error.pgcode = error.sqlstate = "40001"
+    return error
+
+
+class TestRetryTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        await Test.delete()
+        attempts = []
+
+        async def run(transaction):
+            attempts.append(transaction)
+            await Test.use(transaction).create(data="retry", created_at=datetime.datetime.now(),
+                                               updated_at=datetime.datetime.now())
+            if len(attempts) < 3:
+                raise conflict_error()
+            return len(attempts)
+
+        retries = db.pool_stats()["retries"]
+        assert (await db.run_in_transaction(run, retries=3, backoff=0.001)) == 3, ''
+        assert (await Test.select().where(Test.data == "retry").count()) == 1, ''
+        assert db.pool_stats()["retries"] == retries + 2, ''
+        assert db.pool_stats()["in_use"] == 0, ''
+
+        @db.retry_transaction(retries=1, backoff=0.001)
+        async def fail(data, transaction):
+            await Test.use(transaction).create(data=data, created_at=datetime.datetime.now(),
+                                               updated_at=datetime.datetime.now())
+            raise conflict_error()
+
+        retry_failures = db.pool_stats()["retry_failures"]
+        try:
+            await fail("fail")
+        except Exception as e:
+            assert db.is_retryable_error(e), ''
+        else:
+            assert False, ''
+        assert db.pool_stats()["retry_failures"] == retry_failures + 1, ''
+        assert (await Test.select().where(Test.data == "fail").count()) == 0, ''
+
+        async def error(transaction):
+            raise ValueError()
+
+        retries = db.pool_stats()["retries"]
+        try:
+            await db.run_in_transaction(error)
+        except ValueError:
+            pass
+        assert db.pool_stats()["retries"] == retries, ''
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+from tornado.testing import gen_test
+from . import BaseTestCase
+from .model import Test, db
+
+
+class TestSavepointTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        await Test.delete()
+
+        connections = db.pool_stats()["acquires"]
+        async with await db.transaction() as transaction:
+            await Test.use(transaction).create(data="outer", created_at=datetime.datetime.now(),
+                                               updated_at=datetime.datetime.now())
+
+            try:
+                async with transaction.atomic() as savepoint:
+                    await Test.use(savepoint).create(data="inner", created_at=datetime.datetime.now(),
+                                                     updated_at=datetime.datetime.now())
+                    assert (await Test.use(transaction).select().count()) == 2, ''
+                    raise ValueError()
+            except ValueError:
+                pass
+            assert (await Test.use(transaction).select().count()) == 1, ''
+
+            async with transaction.atomic() as savepoint:
+                await Test.use(savepoint).create(data="inner", created_at=datetime.datetime.now(),
+                                                 updated_at=datetime.datetime.now())
+                async with savepoint.atomic() as nested:
+                    await Test.use(nested).update(data="nested").where(Test.data == "inner")
+            assert (await Test.use(transaction).select().count()) == 2, ''
+
+        assert db.pool_stats()["acquires"] == connections + 1, ''
+        assert (await Test.select().where(Test.data == "nested").count()) == 1, ''
+        assert (await Test.select().where(Test.data == "outer").count()) == 1, ''
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import datetime
+import unittest
+from tornado.testing import gen_test
+from torpeewee import MySQLDatabase, PostgresqlDatabase
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+
+@unittest.skipIf(not isinstance(db, (MySQLDatabase, PostgresqlDatabase)), "driver caches statements natively")
+class TestStatementTestCase(BaseTestCase):
+    @gen_test
+    async def test(self):
+        if isinstance(db, MySQLDatabase):
+            try:
+                MySQLDatabase(db.database, prepared_statement_cache_size=2, max_connections=1, **PARAMS)
+            except NotImplementedError:
+                pass
+            else:
+                assert False, ''
+
+            try:
+                await db.execute_sql("SELECT 1; SELECT 2")
+            except Exception:
+                pass
+            else:
+                assert False, ''
+            return
+
+        prepared_db = PostgresqlDatabase(db.database, prepared_statement_cache_size=2, maxsize=1, **PARAMS)
+
+        await Test.delete()
+        await Test.use(prepared_db).create(id=1, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+        await Test.use(prepared_db).create(id=2, data="test", created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
+
+        for i in (1, 2, 1, 2):
+            t = await Test.use(prepared_db).select().where(Test.id == i).first()
+            assert t.id == i, ''
+
+        c = await Test.use(prepared_db).update(data="prepared").where(Test.id == 1)
+        assert c == 1, ''
+        t = await Test.select().where(Test.id == 1).first()
+        assert t.data == "prepared", ''
+
+        stats = prepared_db.prepared_statement_stats()
+        assert stats["hits"] >= 3, ''
+        assert stats["evictions"] >= 1, ''
+
+        await Test.delete()
+        prepared_db.close()
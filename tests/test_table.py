@@ -4,8 +4,9 @@
 
 import datetime
 from tornado.testing import gen_test
+from torpeewee.model import sort_model_levels
 from . import BaseTestCase
-from .model import TestTableModel
+from .model import TestTableModel, TestRelatedModel, TestLevelModelA, TestLevelModelB, TestLevelModelC, db
 
 class TestTableTestCase(BaseTestCase):
     @gen_test
@@ -14,4 +15,20 @@ class TestTableTestCase(BaseTestCase):
         await TestTableModel.create(id = 1, data = 'a', count = 1, created_at=datetime.datetime.now(), updated_at=datetime.datetime.now())
         count = await TestTableModel.select().count()
         assert count == 1
-        await TestTableModel.drop_table()
\ No newline at end of file
+        await TestTableModel.drop_table()
+
+    @gen_test
+    async def test_create_tables(self):
+        level_models = [TestLevelModelA, TestLevelModelB, TestLevelModelC]
+        assert sort_model_levels([TestLevelModelC, TestLevelModelA, TestLevelModelB]) == \
+               [[TestLevelModelA], [TestLevelModelB], [TestLevelModelC]], ''
+
+        models = [TestTableModel, TestRelatedModel] + level_models
+        await db.drop_tables(models)
+        for ordered_models in (models, list(reversed(models))):
+            await db.create_tables(ordered_models)
+            for model in models:
+                assert (await db.table_exists(model._meta.table_name)), ''
+            await db.drop_tables(ordered_models)
+            for model in models:
+                assert not (await db.table_exists(model._meta.table_name)), ''
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import time
+import asyncio
+from tornado.testing import gen_test
+from torpeewee import MySQLDatabase, PostgresqlDatabase, statement_timeout
+from . import BaseTestCase
+from .model import Test, db, PARAMS
+
+
+SLEEP_SQL = "SELECT SLEEP(5)" if isinstance(db, MySQLDatabase) else "SELECT pg_sleep(5)"
+
+
+class TestTimeoutTestCase(BaseTestCase):
+    @gen_test(timeout=30)
+    async def test(self):
+        start_time = time.time()
+        try:
+            with statement_timeout(0.2):
+                await db.execute_sql(SLEEP_SQL)
+        except Exception:
+            pass
+        assert time.time() - start_time < 4, ''
+        assert db.pool_stats()["in_use"] == 0, ''
+
+        start_time = time.time()
+        try:
+            await asyncio.wait_for(db.execute_sql(SLEEP_SQL), 0.2)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            assert False, ''
+        cancellations = db.pool_stats()["cancellations"]
+        assert cancellations >= 1, ''
+        while db.pool_stats()["in_use"] and time.time() - start_time < 4:
+            await asyncio.sleep(0.05)
+        assert db.pool_stats()["in_use"] == 0, ''
+        assert time.time() - start_time < 4, ''
+
+        if isinstance(db, MySQLDatabase):
+            saturated_db = MySQLDatabase(db.database, max_connections=1, **PARAMS)
+        else:
+            saturated_db = type(db)(db.database, maxsize=1, **PARAMS)
+        start_time = time.time()
+        try:
+            with statement_timeout(0.2):
+                await saturated_db.execute_sql(SLEEP_SQL)
+        except Exception:
+            pass
+        assert saturated_db.pool_stats()["in_use"] == 0, ''
+        await Test.use(saturated_db).select().count()
+        assert time.time() - start_time < 4, ''
+        saturated_db.close()
+
+        if isinstance(db, (MySQLDatabase, PostgresqlDatabase)):
+            default_db = type(db)(db.database, statement_timeout=5, autocommit=True, **PARAMS)
+            with statement_timeout(5):
+                await default_db.execute_sql("SELECT 1")
+            assert default_db.pool_stats()["commits"] == 0, ''
+            default_db.close()
+
+        await Test.delete()
+        assert (await Test.select().count()) == 0, ''
+        assert len(list(await Test.select().execute(timeout=5))) == 0, ''
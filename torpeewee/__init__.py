@@ -26,10 +26,16 @@ SOFTWARE.
 
 from peewee import *
 from .model import Model, Using
+from .fields import ForeignKeyField
 from .mysql import MySQLDatabase
-from .postgresql import PostgresqlDatabase
+from .postgresql import PostgresqlDatabase, AsyncpgDatabase
 from .transaction import Transaction
-from .query import ModelSelect, NoopModelSelect, ModelUpdate, ModelInsert, ModelDelete, ModelRaw
+from .replication import ReplicatedDatabase
+from .sharding import ShardedDatabase
+from .cache import QueryCache, CacheBackend, LRUCacheBackend
+from .identity import IdentityMap
+from .timeout import statement_timeout
+from .query import ModelSelect, NoopModelSelect, ModelUpdate, ModelInsert, ModelDelete, ModelRaw, Param, CompiledQuery, prefetch
 
 version = "1.0.2"
 version_info = (1, 0, 2)
\ No newline at end of file
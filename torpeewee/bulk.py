@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import time
+import asyncio
+import tempfile
+from functools import partial
+from peewee import Entity, NodeList, EnclosedNodeList, SQL
+
+
+def row_size(row):
+    values = row.values() if isinstance(row, dict) else row
+    size = 0
+    for value in values:
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value) + 4
+        else:
+            size += 12
+    return size
+
+
+async def iter_batches(rows, batch_size=1000, max_bytes=None):
+    batch, batch_bytes = [], 0
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            batch.append(row)
+            if max_bytes:
+                batch_bytes += row_size(row)
+            if len(batch) >= batch_size or (max_bytes and batch_bytes >= max_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+    else:
+        for row in rows:
+            batch.append(row)
+            if max_bytes:
+                batch_bytes += row_size(row)
+            if len(batch) >= batch_size or (max_bytes and batch_bytes >= max_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+
+def copy_fields(model, fields=None):
+    if fields is None:
+        return [field for field in model._meta.sorted_fields
+                if not (model._meta.auto_increment and field is model._meta.primary_key)]
+    return [model._meta.fields[field] if isinstance(field, str) else field for field in fields]
+
+
+def copy_row(row, fields, convert=True):
+    if isinstance(row, dict):
+        values = []
+        for field in fields:
+            if field.name in row:
+                value = row[field.name]
+            else:
+                value = field.default() if callable(field.default) else field.default
+            values.append(value)
+    else:
+        values = row
+    if convert:
+        return tuple(field.db_value(value) for field, value in zip(fields, values))
+    return tuple(values)
+
+
+async def iter_copy_rows(rows, fields, convert=True):
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield copy_row(row, fields, convert)
+    else:
+        for row in rows:
+            yield copy_row(row, fields, convert)
+
+
+def copy_table(model, fields):
+    table = Entity(*[name for name in (model._meta.schema, model._meta.table_name) if name])
+    return table, EnclosedNodeList([Entity(field.column_name) for field in fields])
+
+
+def encode_mysql_copy_value(value):
+    if value is None:
+        return b"\\N"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, (bytes, bytearray)):
+        data = bytes(value)
+    else:
+        data = str(value).encode("utf-8")
+    return data.replace(b"\\", b"\\\\").replace(b"\t", b"\\t").replace(b"\n", b"\\n") \
+        .replace(b"\r", b"\\r").replace(b"\0", b"\\0")
+
+
+class BulkResult(object):
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.elapsed = 0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0
+        return self.rows / self.elapsed
+
+    def __repr__(self):
+        return "<BulkResult rows=%d batches=%d elapsed=%.3fs rows_per_second=%.1f>" % (
+            self.rows, self.batches, self.elapsed, self.rows_per_second)
+
+
+class BulkInsert(object):
+    def __init__(self, model, database, fields=None, batch_size=1000, max_bytes=1024 * 1024, concurrency=1):
+        self.model = model
+        self.database = database
+        self.fields = fields
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.concurrency = max(concurrency, 1)
+        self.result = BulkResult()
+
+    async def insert_batch(self, batch):
+        await self.model.insert_many(batch, self.fields).bind(self.database).execute()
+        self.result.rows += len(batch)
+        self.result.batches += 1
+
+    async def execute(self, rows):
+        start_time = time.time()
+        pending = set()
+        try:
+            async for batch in iter_batches(rows, self.batch_size, self.max_bytes):
+                if self.concurrency == 1:
+                    await self.insert_batch(batch)
+                    continue
+
+                if len(pending) >= self.concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(asyncio.ensure_future(self.insert_batch(batch)))
+
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                for future in done:
+                    future.result()
+        except:
+            for future in pending:
+                future.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+        finally:
+            self.result.elapsed = time.time() - start_time
+        return self.result
+
+
+class MySQLLoadData(object):
+    def __init__(self, model, database, fields=None, batch_size=100000, write_size=1000):
+        self.model = model
+        self.database = database
+        self.fields = copy_fields(model, fields)
+        self.batch_size = batch_size
+        self.write_size = write_size
+        self.result = BulkResult()
+
+    def sql(self):
+        table, columns = copy_table(self.model, self.fields)
+        return self.database.get_sql_context().sql(NodeList((
+            SQL("LOAD DATA LOCAL INFILE %s INTO TABLE"), table,
+            SQL("CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n'"),
+            columns))).query()[0]
+
+    async def write_lines(self, fileobj, lines):
+        loop = asyncio.get_event_loop()
+        if fileobj is None:
+            fileobj = await loop.run_in_executor(None, partial(tempfile.NamedTemporaryFile, prefix="torpeewee_",
+                                                                suffix=".tsv"))
+        await loop.run_in_executor(None, fileobj.writelines, lines)
+        return fileobj
+
+    async def load_file(self, sql, fileobj, rows):
+        await asyncio.get_event_loop().run_in_executor(None, fileobj.flush)
+        await self.database.execute_sql(sql, (fileobj.name,))
+        self.result.rows += rows
+        self.result.batches += 1
+
+    async def execute(self, rows):
+        start_time = time.time()
+        sql = self.sql()
+        try:
+            fileobj, lines, count = None, [], 0
+            try:
+                async for row in iter_copy_rows(rows, self.fields):
+                    lines.append(b"\t".join([encode_mysql_copy_value(value) for value in row]) + b"\n")
+                    count += 1
+                    if len(lines) >= self.write_size or count >= self.batch_size:
+                        fileobj, lines = await self.write_lines(fileobj, lines), []
+                    if count >= self.batch_size:
+                        await self.load_file(sql, fileobj, count)
+                        await asyncio.get_event_loop().run_in_executor(None, fileobj.close)
+                        fileobj, count = None, 0
+                if lines:
+                    fileobj, lines = await self.write_lines(fileobj, lines), []
+                if fileobj is not None:
+                    await self.load_file(sql, fileobj, count)
+            finally:
+                if fileobj is not None:
+                    await asyncio.get_event_loop().run_in_executor(None, fileobj.close)
+        finally:
+            self.result.elapsed = time.time() - start_time
+        return self.result
+
+
+class AsyncpgCopy(object):
+    def __init__(self, model, fields=None):
+        self.model = model
+        self.fields = copy_fields(model, fields)
+        self.result = BulkResult()
+
+    async def records(self, rows):
+        async for row in iter_copy_rows(rows, self.fields):
+            self.result.rows += 1
+            yield row
+
+    async def execute(self, connection, rows):
+        start_time = time.time()
+        try:
+            await connection.copy_records_to_table(self.model._meta.table_name, records=self.records(rows),
+                                                   columns=[field.column_name for field in self.fields],
+                                                   schema_name=self.model._meta.schema)
+            self.result.batches = 1
+        finally:
+            self.result.elapsed = time.time() - start_time
+        return self.result
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import time
+import hashlib
+import weakref
+import asyncio
+from collections import OrderedDict, deque
+from peewee import ModelAlias, Table, SelectBase
+
+query_caches = weakref.WeakSet()
+
+
+def query_tables(query, tables=None):
+    if tables is None:
+        tables = set()
+
+    sources = list(getattr(query, "_from_list", None) or ())
+    for dests in (getattr(query, "_joins", None) or {}).values():
+        sources.extend(dest[0] for dest in dests)
+    if getattr(query, "model", None) is not None:
+        sources.append(query.model)
+
+    for source in sources:
+        if isinstance(source, ModelAlias):
+            source = source.model
+        if isinstance(source, SelectBase):
+            query_tables(source, tables)
+        elif isinstance(source, Table):
+            tables.add(source.__name__)
+        elif hasattr(source, "_meta"):
+            tables.add(source._meta.table_name)
+    return tables
+
+
+async def invalidate_tables(tables, transaction=None):
+    for cache in list(query_caches):
+        await cache.invalidate(tables)
+    if transaction is not None:
+        transaction.pending_tables.update(tables)
+
+
+def database_key(database):
+    params = getattr(database, "connect_params", None) or {}
+    return "%s:%s:%s/%s" % (type(database).__name__, params.get("host", ""), params.get("port", ""),
+                            database.database)
+
+
+class CacheBackend(object):
+    async def get(self, key):
+        raise NotImplementedError
+
+    async def set(self, key, value, ttl, tables):
+        raise NotImplementedError
+
+    async def invalidate(self, tables):
+        raise NotImplementedError
+
+
+class LRUCacheBackend(CacheBackend):
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.tables = {}
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[2]:
+            keys = self.tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tables[table]
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] < time.time():
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key, value, ttl, tables):
+        self.remove(key)
+        while self.entries and len(self.entries) >= self.max_size:
+            self.remove(next(iter(self.entries)))
+        self.entries[key] = (time.time() + ttl if ttl else None, value, tuple(tables))
+        for table in tables:
+            self.tables.setdefault(table, set()).add(key)
+
+    async def invalidate(self, tables):
+        for table in tables:
+            for key in list(self.tables.get(table, ())):
+                self.remove(key)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class QueryCacheStats(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+class CachedCursor(object):
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = deque(rows)
+        self.rowcount = len(rows)
+        self.lastrowid = None
+
+    def fetchone(self):
+        if self.rows:
+            return self.rows.popleft()
+        return None
+
+    def fetchall(self):
+        rows, self.rows = list(self.rows), deque()
+        return rows
+
+    def close(self):
+        pass
+
+
+class Flight(object):
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    def __init__(self):
+        self.executions = 0
+        self.coalesced = 0
+        self._pending = {}
+
+    def __contains__(self, key):
+        return key in self._pending
+
+    def finish(self, key, flight):
+        if self._pending.get(key) is flight:
+            del self._pending[key]
+
+    async def do(self, key, loader):
+        flight = self._pending.get(key)
+        if flight is None:
+            self.executions += 1
+            flight = self._pending[key] = Flight(asyncio.ensure_future(loader()))
+            flight.task.add_done_callback(lambda task: self.finish(key, flight))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                self.finish(key, flight)
+                flight.task.cancel()
+
+    async def execute(self, database, query):
+        sql, params = database.get_sql_context().sql(query).query()
+
+        async def loader():
+            cursor = await database.execute(query)
+            return cursor.description, cursor.fetchall()
+
+        description, rows = await self.do((id(database), sql, repr(params)), loader)
+        return CachedCursor(description, rows)
+
+    def as_dict(self):
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._pending),
+        }
+
+
+class QueryCache(object):
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else LRUCacheBackend()
+        self.stats = QueryCacheStats()
+        self._singleflight = SingleFlight()
+        self._generations = {}
+        query_caches.add(self)
+
+    def cache_key(self, database, sql, params):
+        key = "%s\n%s\n%r" % (database_key(database), sql, tuple(params or ()))
+        return "torpeewee:" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    async def fetch(self, key, tables, ttl, loader):
+        value = await self.backend.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+
+        if key in self._singleflight:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+
+        async def load():
+            generations = [self._generations.get(table, 0) for table in tables]
+            value = await loader()
+            if generations == [self._generations.get(table, 0) for table in tables]:
+                await self.backend.set(key, value, ttl, tables)
+            return value
+        return await self._singleflight.do(key, load)
+
+    async def execute(self, database, query, ttl):
+        sql, params = database.get_sql_context().sql(query).query()
+        tables = sorted(query_tables(query))
+
+        async def loader():
+            cursor = await database.execute(query)
+            return cursor.description, cursor.fetchall()
+
+        description, rows = await self.fetch(self.cache_key(database, sql, params), tables, ttl, loader)
+        return CachedCursor(description, rows)
+
+    async def invalidate(self, tables):
+        for table in tables:
+            self._generations[table] = self._generations.get(table, 0) + 1
+        self.stats.invalidations += 1
+        await self.backend.invalidate(tables)
+
+
+query_cache = QueryCache()
+query_singleflight = SingleFlight()
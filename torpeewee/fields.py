@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+from peewee import ForeignKeyField as BaseForeignKeyField, ForeignKeyAccessor as BaseForeignKeyAccessor
+
+
+class RelatedList(list):
+    def __aiter__(self):
+        return RelatedListIter(self)
+
+
+class RelatedListIter(object):
+    def __init__(self, items):
+        self._iter = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class ForeignKeyAccessor(BaseForeignKeyAccessor):
+    def get_rel_instance(self, instance):
+        if self.name in instance.__rel__:
+            return instance.__rel__[self.name]
+
+        value = instance.__data__.get(self.name)
+        if value is not None:
+            if self.field.lazy_load and hasattr(instance, "fetch_related"):
+                return instance.fetch_related(self.name)
+            return value
+        elif not self.field.null:
+            raise self.rel_model.DoesNotExist
+        return value
+
+
+class ForeignKeyField(BaseForeignKeyField):
+    accessor_class = ForeignKeyAccessor
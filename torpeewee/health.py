@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import time
+import random
+import weakref
+import asyncio
+
+
+async def warmup(database, min_size=1):
+    conns = [await database.connection()]
+    try:
+        min_size = min(min_size, database._pool_info()["max_size"])
+        results = await asyncio.gather(*[database.connection() for _ in range(min_size - 1)],
+                                       return_exceptions=True)
+        conns.extend(conn for conn in results if not isinstance(conn, BaseException))
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+    finally:
+        for conn in conns:
+            await database._close(conn)
+    return len(conns)
+
+
+class PoolHealth(object):
+    def __init__(self, database, health_check_interval=None, max_lifetime=None):
+        self.database = database
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.created_at = weakref.WeakKeyDictionary()
+        self._task = None
+
+    def on_acquire(self, conn):
+        key = self.database._connection_key(conn)
+        if key not in self.created_at:
+            lifetime = self.max_lifetime
+            self.created_at[key] = time.time() - (random.uniform(0, lifetime * 0.1) if lifetime else 0)
+        self.start()
+
+    def is_expired(self, conn):
+        if not self.max_lifetime:
+            return False
+        created_at = self.created_at.get(self.database._connection_key(conn))
+        return created_at is not None and time.time() - created_at >= self.max_lifetime
+
+    def forget(self, conn):
+        self.created_at.pop(self.database._connection_key(conn), None)
+
+    def start(self):
+        if not self.health_check_interval or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+
+    async def run(self):
+        while not self.database.is_closed():
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+    async def check(self):
+        checked = 0
+        for _ in range(self.database._pool_info()["idle"]):
+            conn = await self.database._acquire_idle()
+            if conn is None:
+                break
+            await self.ping(conn)
+            checked += 1
+        return checked
+
+    async def ping(self, conn):
+        if self.is_expired(conn):
+            return await self.database._close(conn)
+
+        try:
+            await self.database._ping(conn)
+        except Exception:
+            self.database._metrics.on_ping(False)
+            return await self.database._close(conn, True)
+        self.database._metrics.on_ping(True)
+        await self.database._close(conn)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import contextvars
+from peewee import OP, Expression, Node, CompositeKey
+
+current_identity_map = contextvars.ContextVar("torpeewee_identity_map", default=None)
+
+
+def get_identity_map():
+    return current_identity_map.get()
+
+
+def query_primary_keys(query):
+    where = query._where
+    primary_key = query.model._meta.primary_key
+    if not isinstance(where, Expression) or not primary_key or isinstance(primary_key, CompositeKey) \
+            or where.lhs is not primary_key:
+        return None
+    if where.op == OP.EQ and not isinstance(where.rhs, Node):
+        return [primary_key.adapt(where.rhs)]
+    if where.op == OP.IN and isinstance(where.rhs, (list, tuple, set, frozenset)):
+        return [primary_key.adapt(value) for value in where.rhs]
+    return None
+
+
+def query_identity(query):
+    if not isinstance(query._where, Expression) or query._where.op != OP.EQ:
+        return None
+    pks = query_primary_keys(query)
+    if pks is None:
+        return None
+    if not query._is_default or query._row_type is not None or query._joins or query._for_update \
+            or query._group_by or query._having or query._offset:
+        return None
+    return query.model, pks[0]
+
+
+class IdentityMap(object):
+    def __init__(self):
+        self.instances = {}
+        self.hits = 0
+        self.misses = 0
+        self._token = None
+
+    def get(self, model, pk, database=None):
+        instance = self.instances.get((database or model._meta.database, model, pk))
+        if instance is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return instance
+
+    def get_query(self, query, database=None):
+        identity = query_identity(query)
+        if identity is None:
+            return None
+        return self.get(*identity, database=database or query._database)
+
+    def add(self, instance, replace=False, database=None):
+        pk = instance._pk
+        if pk is None or isinstance(instance._meta.primary_key, CompositeKey):
+            return instance
+        key = (database or instance._meta.database, type(instance), pk)
+        if replace or key not in self.instances:
+            self.instances[key] = instance
+            return instance
+        return self.instances[key]
+
+    def remove(self, model, pk=None):
+        for key in [key for key in self.instances if key[1] is model and (pk is None or key[2] == pk)]:
+            del self.instances[key]
+
+    def remove_query(self, query):
+        pks = query_primary_keys(query)
+        if pks is None:
+            return self.remove(query.model)
+        pks = set(pks)
+        for key in [key for key in self.instances if key[1] is query.model and key[2] in pks]:
+            del self.instances[key]
+
+    def clear(self):
+        self.instances.clear()
+
+    def enter(self):
+        self._token = current_identity_map.set(self)
+        return self
+
+    def exit(self):
+        if self._token is not None:
+            current_identity_map.reset(self._token)
+            self._token = None
+        self.clear()
+
+    def __enter__(self):
+        return self.enter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.exit()
+
+    async def __aenter__(self):
+        return self.enter()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.exit()
+
+    def __len__(self):
+        return len(self.instances)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import json
+import uuid
+import base64
+import decimal
+import datetime
+import operator
+from functools import reduce
+from peewee import Ordering, CompositeKey, Alias
+
+DATETIME_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S")
+DATE_FORMATS = ("%Y-%m-%d",)
+TIME_FORMATS = ("%H:%M:%S.%f", "%H:%M:%S")
+
+
+def parse_datetime(value, formats):
+    for value_format in formats:
+        for suffix in ("", "%z"):
+            try:
+                return datetime.datetime.strptime(value, value_format + suffix)
+            except ValueError:
+                pass
+    raise ValueError("Invalid keyset datetime value %r." % value)
+
+
+VALUE_TYPES = {
+    "datetime": (datetime.datetime, lambda value: value.strftime(DATETIME_FORMATS[0] + "%z"),
+                 lambda value: parse_datetime(value, DATETIME_FORMATS)),
+    "date": (datetime.date, lambda value: value.strftime(DATE_FORMATS[0]),
+             lambda value: parse_datetime(value, DATE_FORMATS).date()),
+    "time": (datetime.time, lambda value: value.strftime(TIME_FORMATS[0] + "%z"),
+             lambda value: parse_datetime(value, TIME_FORMATS).timetz()),
+    "decimal": (decimal.Decimal, str, decimal.Decimal),
+    "uuid": (uuid.UUID, str, uuid.UUID),
+}
+
+
+def encode_value(value):
+    for name, (value_type, encode, _) in VALUE_TYPES.items():
+        if isinstance(value, value_type):
+            return {"$t": name, "v": encode(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$t": "bytes", "v": base64.b64encode(bytes(value)).decode("ascii")}
+    raise TypeError("Keyset value %r is not serializable." % (value,))
+
+
+def decode_value(value):
+    if "$t" not in value:
+        return value
+    if value["$t"] == "bytes":
+        return base64.b64decode(value["v"])
+    return VALUE_TYPES[value["$t"]][2](value["v"])
+
+
+def encode_token(values):
+    data = json.dumps(values, default=encode_value, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_token(token):
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(data.decode("utf-8"), object_hook=decode_value)
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid keyset token %r." % token)
+    if not isinstance(values, list):
+        raise ValueError("Invalid keyset token %r." % token)
+    return values
+
+
+def keyset_orderings(model, order_by=None):
+    if order_by is None:
+        order_by = ()
+    elif not isinstance(order_by, (list, tuple)):
+        order_by = (order_by,)
+
+    orderings = []
+    for node in order_by:
+        if isinstance(node, str):
+            orderings.append((model._meta.fields[node], False))
+        elif isinstance(node, Ordering):
+            orderings.append((node.node, node.direction.upper() == "DESC"))
+        else:
+            orderings.append((node, False))
+        if getattr(orderings[-1][0], "null", False):
+            raise ValueError('Keyset column "%s" must not be nullable.' % orderings[-1][0].name)
+
+    primary_key = model._meta.primary_key
+    if isinstance(primary_key, CompositeKey):
+        for name in primary_key.field_names:
+            if not any(field is model._meta.fields[name] for field, _ in orderings):
+                orderings.append((model._meta.fields[name], False))
+    elif primary_key and not any(field is primary_key for field, _ in orderings):
+        orderings.append((primary_key, False))
+    return orderings
+
+
+def keyset_expression(orderings, values):
+    clauses = []
+    for index, (field, desc) in enumerate(orderings):
+        expression = field < values[index] if desc else field > values[index]
+        for prev_index in range(index):
+            expression = (orderings[prev_index][0] == values[prev_index]) & expression
+        clauses.append(expression)
+
+    expression = reduce(operator.or_, clauses)
+    if len(orderings) > 1:
+        field, desc = orderings[0]
+        expression = (field <= values[0] if desc else field >= values[0]) & expression
+    return expression
+
+
+def keyset_column_index(columns, field):
+    for index, column in enumerate(columns):
+        if column is field or (isinstance(column, Alias) and column.node is field):
+            return index
+    raise ValueError('Keyset column "%s" must be selected.' % field.name)
+
+
+def keyset_values(row, orderings, columns=()):
+    if isinstance(row, dict):
+        values = [row[field.name] for field, _ in orderings]
+    elif isinstance(row, (tuple, list)):
+        values = [row[keyset_column_index(columns, field)] for field, _ in orderings]
+    else:
+        values = [row.__data__.get(field.name) for field, _ in orderings]
+    for (field, _), value in zip(orderings, values):
+        if value is None:
+            raise ValueError('Keyset column "%s" returned NULL.' % field.name)
+    return values
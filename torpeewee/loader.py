@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import weakref
+import contextvars
+from peewee import chunked
+from .identity import get_identity_map
+
+loaders = weakref.WeakKeyDictionary()
+
+
+def get_loader(model, field, database, many=False, max_batch_size=1000):
+    model_loaders = loaders.setdefault(model, {})
+    key = (field.name, id(database), many)
+    loader = model_loaders.get(key)
+    if loader is None or loader.database is not database or loader.loop is not asyncio.get_event_loop():
+        loader = model_loaders[key] = Loader(model, field, database, many, max_batch_size)
+    return loader
+
+
+class Loader(object):
+    def __init__(self, model, field, database, many=False, max_batch_size=1000):
+        self.model = model
+        self.field = field
+        self.database = database
+        self.many = many
+        self.max_batch_size = max_batch_size
+        self.loop = asyncio.get_event_loop()
+        self.batches = 0
+        self._pending = {}
+        self._scheduled = False
+
+    async def load(self, key):
+        key = self.field.adapt(key)
+        identity_map = get_identity_map()
+        if identity_map is not None and not self.many and self.field is self.model._meta.primary_key:
+            instance = identity_map.get(self.model, key, self.database)
+            if instance is not None:
+                return instance
+
+        if self.database.in_transaction():
+            future = self.loop.create_future()
+            await self.fetch({key: future})
+            result = future.result()
+        else:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self.loop.create_future()
+                if not self._scheduled:
+                    self._scheduled = True
+                    contextvars.Context().run(self.loop.call_soon, self.dispatch)
+            result = await asyncio.shield(future)
+
+        if identity_map is None:
+            return result
+        if self.many:
+            return [identity_map.add(instance, database=self.database) for instance in result]
+        return identity_map.add(result, database=self.database) if result is not None else None
+
+    def dispatch(self):
+        pending, self._pending, self._scheduled = self._pending, {}, False
+        for batch in chunked(pending.items(), self.max_batch_size):
+            asyncio.ensure_future(self.fetch(dict(batch)))
+
+    async def fetch(self, futures):
+        self.batches += 1
+        try:
+            rows = await self.model.select().where(self.field.in_(list(futures))).bind(self.database)
+            instances = {}
+            for row in rows:
+                if self.many:
+                    instances.setdefault(row.__data__.get(self.field.name), []).append(row)
+                else:
+                    instances.setdefault(row.__data__.get(self.field.name), row)
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()
+        else:
+            for key, future in futures.items():
+                if not future.done():
+                    future.set_result(instances.get(key, [] if self.many else None))
+        finally:
+            for future in futures.values():
+                if not future.done():
+                    future.cancel()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import time
+import logging
+
+EVENTS = ("acquire", "release", "query", "error", "retry")
+
+
+class PoolMetrics(object):
+    def __init__(self):
+        self.hooks = {event: [] for event in EVENTS}
+        self.checkouts = {}
+        self.waiting = 0
+        self.acquires = 0
+        self.acquire_wait_time = 0
+        self.max_acquire_wait_time = 0
+        self.exhausted = 0
+        self.releases = 0
+        self.checkout_time = 0
+        self.max_checkout_time = 0
+        self.queries = 0
+        self.query_time = 0
+        self.max_query_time = 0
+        self.rows = 0
+        self.errors = 0
+        self.commits = 0
+        self.retries = 0
+        self.retry_failures = 0
+        self.retry_sites = {}
+        self.timeouts = 0
+        self.cancellations = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.recycled = 0
+        self.read_retries = 0
+
+    def add_hook(self, event, callback):
+        if event not in self.hooks:
+            raise ValueError('Unknown hook event "%s", must be one of %s.' % (event, ", ".join(EVENTS)))
+        self.hooks[event].append(callback)
+
+    def remove_hook(self, event, callback):
+        if event in self.hooks and callback in self.hooks[event]:
+            self.hooks[event].remove(callback)
+
+    def emit(self, event, *args):
+        for callback in list(self.hooks[event]):
+            try:
+                callback(*args)
+            except Exception:
+                logging.getLogger("torpeewee").exception("%s hook %r failed", event, callback)
+
+    def start_acquire(self, exhausted):
+        self.waiting += 1
+        if exhausted:
+            self.exhausted += 1
+        return time.time()
+
+    def on_acquire(self, conn, start_time):
+        now = time.time()
+        wait_time = now - start_time
+        self.waiting -= 1
+        if conn is None:
+            return
+        self.acquires += 1
+        self.acquire_wait_time += wait_time
+        self.max_acquire_wait_time = max(self.max_acquire_wait_time, wait_time)
+        self.checkouts[id(conn)] = now
+        self.emit("acquire", conn, wait_time)
+
+    def on_release(self, conn):
+        start_time = self.checkouts.pop(id(conn), None)
+        if start_time is None:
+            return
+        checkout_time = time.time() - start_time
+        self.releases += 1
+        self.checkout_time += checkout_time
+        self.max_checkout_time = max(self.max_checkout_time, checkout_time)
+        self.emit("release", conn, checkout_time)
+
+    def on_query(self, sql, params, start_time, rows):
+        query_time = time.time() - start_time
+        self.queries += 1
+        self.query_time += query_time
+        self.max_query_time = max(self.max_query_time, query_time)
+        if rows and rows > 0:
+            self.rows += rows
+        self.emit("query", sql, params, query_time, rows)
+
+    def on_error(self, sql, params, exc):
+        self.errors += 1
+        self.emit("error", sql, params, exc)
+
+    def on_retry(self, name, attempt, exc, delay):
+        self.retries += 1
+        self.retry_sites[name] = self.retry_sites.get(name, 0) + 1
+        self.emit("retry", name, attempt, exc, delay)
+
+    def on_retry_failure(self, name, attempt, exc):
+        self.retry_failures += 1
+
+    def on_cancel(self, timeout):
+        if timeout:
+            self.timeouts += 1
+        else:
+            self.cancellations += 1
+
+    def on_ping(self, alive):
+        self.pings += 1
+        if not alive:
+            self.ping_failures += 1
+
+    def on_commit(self):
+        self.commits += 1
+
+    def on_recycle(self):
+        self.recycled += 1
+
+    def on_read_retry(self, sql, params, exc):
+        self.read_retries += 1
+
+    def as_dict(self):
+        return {
+            "in_use": len(self.checkouts),
+            "waiting": self.waiting,
+            "acquires": self.acquires,
+            "acquire_wait_time": self.acquire_wait_time,
+            "max_acquire_wait_time": self.max_acquire_wait_time,
+            "exhausted": self.exhausted,
+            "releases": self.releases,
+            "checkout_time": self.checkout_time,
+            "max_checkout_time": self.max_checkout_time,
+            "queries": self.queries,
+            "query_time": self.query_time,
+            "max_query_time": self.max_query_time,
+            "rows": self.rows,
+            "errors": self.errors,
+            "commits": self.commits,
+            "retries": self.retries,
+            "retry_failures": self.retry_failures,
+            "retry_sites": dict(self.retry_sites),
+            "timeouts": self.timeouts,
+            "cancellations": self.cancellations,
+            "pings": self.pings,
+            "ping_failures": self.ping_failures,
+            "recycled": self.recycled,
+            "read_retries": self.read_retries,
+        }
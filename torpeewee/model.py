@@ -3,13 +3,36 @@
 # create by: snower
 
 import sys
+import asyncio
 from peewee import Model as BaseModel, SchemaManager as BaseSchemaManager, ModelAlias, BaseQuery, IntegrityError, DoesNotExist, __deprecated__
+from peewee import CompositeKey, ForeignKeyField, Node, Case, chunked, sort_models
 from .query import ModelSelect, NoopModelSelect, ModelUpdate, ModelInsert, ModelDelete, ModelRaw
+from .bulk import BulkInsert
+from .cache import invalidate_tables
+from .transaction import find_transaction
+from .identity import get_identity_map
+from .loader import get_loader
+from .fields import RelatedList
 
 if sys.version_info[0] == 3:
     basestring = str
 
 
+def sort_model_levels(models):
+    models = sort_models(models)
+    model_set = set(models)
+    levels = {}
+    for model in models:
+        dependency_levels = [levels[rel_model] + 1 for rel_model in model._meta.refs.values()
+                             if rel_model in model_set and rel_model is not model and rel_model in levels]
+        levels[model] = max(dependency_levels) if dependency_levels else 0
+
+    model_levels = [[] for _ in range(max(levels.values()) + 1)] if levels else []
+    for model in models:
+        model_levels[levels[model]].append(model)
+    return model_levels
+
+
 class SchemaManager(BaseSchemaManager):
     async def create_table(self, safe=True, **options):
         await self.database.execute(self._create_table(safe=safe, **options))
@@ -17,13 +40,18 @@ class SchemaManager(BaseSchemaManager):
     async def drop_table(self, safe=True, **options):
         await self.database.execute(self._drop_table(safe=safe, **options))
 
+    async def execute_queries(self, queries):
+        if self.database.in_transaction():
+            for query in queries:
+                await self.database.execute(query)
+        else:
+            await asyncio.gather(*[self.database.execute(query) for query in queries])
+
     async def create_indexes(self, safe=True):
-        for query in self._create_indexes(safe=safe):
-            await self.database.execute(query)
+        await self.execute_queries(self._create_indexes(safe=safe))
 
     async def drop_indexes(self, safe=True):
-        for query in self._drop_indexes(safe=safe):
-            await self.database.execute(query)
+        await self.execute_queries(self._drop_indexes(safe=safe))
 
     async def create_sequence(self, field):
         seq_ctx = self._create_sequence(field)
@@ -94,6 +122,81 @@ class Model(BaseModel):
     def insert_many(cls, rows, fields=None):
         return ModelInsert(cls, insert=rows, columns=fields)
 
+    @classmethod
+    async def bulk_insert(cls, rows, fields=None, batch_size=1000, max_bytes=1024 * 1024, concurrency=1,
+                          atomic=False, using=None):
+        database = using or cls._meta.database
+        if atomic and not database.in_transaction():
+            async with await database.transaction() as transaction:
+                return await BulkInsert(cls, transaction, fields, batch_size, max_bytes, 1).execute(rows)
+        if database.in_transaction():
+            concurrency = 1
+        return await BulkInsert(cls, database, fields, batch_size, max_bytes, concurrency).execute(rows)
+
+    @classmethod
+    async def bulk_update(cls, model_list, fields=None, batch_size=None, using=None):
+        if isinstance(cls._meta.primary_key, CompositeKey):
+            raise ValueError('bulk_update() is not supported for models with '
+                             'a composite primary key.')
+
+        pk = cls._meta.primary_key
+        groups = {}
+        if fields is None:
+            for model in model_list:
+                dirty_fields = tuple(field for field in model.dirty_fields if field is not pk)
+                if dirty_fields:
+                    groups.setdefault(dirty_fields, []).append(model)
+        else:
+            fields = tuple(cls._meta.fields[f] if isinstance(f, basestring) else f
+                           for f in fields)
+            groups[fields] = list(model_list)
+
+        n = 0
+        for group_fields, group_models in groups.items():
+            attrs = [field.object_id_name if isinstance(field, ForeignKeyField)
+                     else field.name for field in group_fields]
+            batches = chunked(group_models, batch_size) if batch_size else [group_models]
+
+            for batch in batches:
+                id_list = [model._pk for model in batch]
+                update = {}
+                for field, attr in zip(group_fields, attrs):
+                    accum = []
+                    for model in batch:
+                        value = getattr(model, attr)
+                        if not isinstance(value, Node):
+                            value = field.to_value(value)
+                        accum.append((pk.to_value(model._pk), value))
+                    update[field] = Case(pk, accum)
+
+                query = cls.update(update).where(pk.in_(id_list))
+                if using:
+                    query = query.bind(using)
+                n += await query.execute()
+
+                for model in batch:
+                    for field in group_fields:
+                        model._dirty.discard(field.name)
+        return n
+
+    @classmethod
+    async def copy_from(cls, rows, fields=None, using=None, **kwargs):
+        database = using or cls._meta.database
+        result = await database.copy_from(cls, rows, fields, **kwargs)
+        await invalidate_tables([cls._meta.table_name], find_transaction(database))
+        return result
+
+    @classmethod
+    async def load(cls, key, field=None, using=None):
+        field = cls._meta.primary_key if field is None else field
+        if isinstance(field, basestring):
+            field = cls._meta.fields[field]
+        return await get_loader(cls, field, using or cls._meta.database).load(key)
+
+    @classmethod
+    async def load_many(cls, keys, field=None, using=None):
+        return await asyncio.gather(*[cls.load(key, field, using) for key in keys])
+
     @classmethod
     def insert_from(cls, query, fields):
         columns = [getattr(cls, field) if isinstance(field, basestring)
@@ -198,6 +301,9 @@ class Model(BaseModel):
                 await self.insert(**field_dict).execute()
 
         self._dirty.clear()
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.add(self, replace=True, database=use_database)
         return rows
 
     async def dependencies(self, search_nullable=False, using=None):
@@ -250,6 +356,40 @@ class Model(BaseModel):
             return await self.__class__.use(use_database).delete().where(self._pk_expr()).execute()
         return await self.delete().where(self._pk_expr()).execute()
 
+    async def fetch_related(self, *names, using=None):
+        use_database = using or self._use_database
+        results = await asyncio.gather(*[self._fetch_related(name, use_database) for name in names])
+        return results[0] if len(names) == 1 else results
+
+    async def _fetch_related(self, name, use_database=None):
+        field = self._meta.fields.get(name)
+        if isinstance(field, ForeignKeyField):
+            if name in self.__rel__:
+                return self.__rel__[name]
+            value = self.__data__.get(name)
+            if value is None:
+                return None
+            instance = await get_loader(field.rel_model, field.rel_field,
+                                        use_database or field.rel_model._meta.database).load(value)
+            if instance is None:
+                raise field.rel_model.DoesNotExist('%s instance matching %s = %s does not exist' % (
+                    field.rel_model.__name__, field.rel_field.name, value))
+            self.__rel__[name] = instance
+            return instance
+
+        for fk, rel_model in self._meta.backrefs.items():
+            if fk.backref == name:
+                if isinstance(self.__dict__.get(name), list):
+                    return self.__dict__[name]
+                instances = await get_loader(rel_model, fk, use_database or rel_model._meta.database,
+                                             many=True).load(self.__data__.get(fk.rel_field.name))
+                for instance in instances:
+                    instance.__rel__[fk.name] = self
+                self.__dict__[name] = RelatedList(instances)
+                return self.__dict__[name]
+
+        raise AttributeError('%s has no foreign key or backref named "%s".' % (type(self).__name__, name))
+
     @classmethod
     async def create_table(cls, safe=True, **options):
         if 'fail_silently' in options:
@@ -308,6 +448,24 @@ class Using(object):
         await inst.save(force_insert=True, using=self.database)
         return inst
 
+    async def bulk_insert(self, rows, **kwargs):
+        kwargs["using"] = self.database
+        return await self.model_class.bulk_insert(rows, **kwargs)
+
+    async def bulk_update(self, model_list, **kwargs):
+        kwargs["using"] = self.database
+        return await self.model_class.bulk_update(model_list, **kwargs)
+
+    async def copy_from(self, rows, **kwargs):
+        kwargs["using"] = self.database
+        return await self.model_class.copy_from(rows, **kwargs)
+
+    async def load(self, key, field=None):
+        return await self.model_class.load(key, field, using=self.database)
+
+    async def load_many(self, keys, field=None):
+        return await self.model_class.load_many(keys, field, using=self.database)
+
     async def get_or_create(self, **kwargs):
         defaults = kwargs.pop('defaults', {})
         query = self.model_class.select().bind(self.database)
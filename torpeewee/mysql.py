@@ -2,13 +2,38 @@
 # 16/6/28
 # create by: snower
 
-from peewee import MySQLDatabase as BaseMySQLDatabase, IndexMetadata, ViewMetadata, ColumnMetadata, ForeignKeyMetadata, sort_models, SENTINEL
-from .transaction import Atomic, Transaction as BaseTransaction
+import re
+import time
+import asyncio
+from peewee import MySQLDatabase as BaseMySQLDatabase, IndexMetadata, ViewMetadata, ColumnMetadata, ForeignKeyMetadata, SENTINEL
+from .transaction import Atomic, Transaction as BaseTransaction, get_current_transaction, run_in_transaction, \
+    retry_transaction
+from .bulk import MySQLLoadData
+from .metrics import PoolMetrics
+from .model import sort_model_levels
+from .timeout import get_statement_timeout, execute_cancellable
+from .health import PoolHealth, warmup
+from .replication import is_read_sql
 
 try:
     import tormysql
+    from pymysql.err import MySQLError, InterfaceError
 except ImportError:
     tormysql = None
+    MySQLError = InterfaceError = None
+
+RETRYABLE_ERRORS = (1205, 1213)
+CONNECTION_ERRORS = (2006, 2013, 2055)
+
+SELECT_RE = re.compile(r"^\s*SELECT\b", re.I)
+
+
+def add_max_execution_time(sql, timeout):
+    match = SELECT_RE.match(sql)
+    if match is None:
+        return sql
+    return "%s /*+ MAX_EXECUTION_TIME(%d) */%s" % (match.group(0), max(1, int(timeout * 1000)), sql[match.end():])
+
 
 class AsyncMySQLDatabase(BaseMySQLDatabase):
     def begin(self):
@@ -50,6 +75,10 @@ class AsyncMySQLDatabase(BaseMySQLDatabase):
     def atomic(self, *args, **kwargs):
         return Atomic(self, *args, **kwargs)
 
+    def is_retryable_error(self, e):
+        return MySQLError is not None and isinstance(e, MySQLError) and bool(e.args) \
+               and e.args[0] in RETRYABLE_ERRORS
+
     async def table_exists(self, table_name, schema=None):
         return table_name in (await self.get_tables(schema=schema))
 
@@ -109,13 +138,69 @@ class AsyncMySQLDatabase(BaseMySQLDatabase):
     async def sequence_exists(self, seq):
         raise NotImplementedError
 
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        raise NotImplementedError
+
+    async def stream(self, query, **context_options):
+        ctx = self.get_sql_context(**context_options)
+        sql, params = ctx.sql(query).query()
+        return await self.stream_sql(sql, params)
+
+    async def copy_from(self, model, rows, fields=None, batch_size=100000):
+        return await MySQLLoadData(model, self, fields, batch_size).execute(rows)
+
     async def create_tables(self, models, **options):
-        for model in sort_models(models):
-            await model.create_table(**options)
+        for level in sort_model_levels(models):
+            if self.in_transaction():
+                for model in level:
+                    await model.create_table(**options)
+            else:
+                await asyncio.gather(*[model.create_table(**options) for model in level])
 
     async def drop_tables(self, models, **kwargs):
-        for model in reversed(sort_models(models)):
-            await model.drop_table(**kwargs)
+        for level in reversed(sort_model_levels(models)):
+            if self.in_transaction():
+                for model in reversed(level):
+                    await model.drop_table(**kwargs)
+            else:
+                await asyncio.gather(*[model.drop_table(**kwargs) for model in level])
+
+
+class StreamCursor(object):
+    def __init__(self, connection, cursor, database=None, commit=False, transaction=None):
+        self._connection = connection
+        self._cursor = cursor
+        self._database = database
+        self._commit = commit
+        self._transaction = transaction
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    async def fetchmany(self, size=None):
+        return await self._cursor.fetchmany(size)
+
+    async def close(self):
+        if self._connection is None:
+            return
+
+        connection, self._connection = self._connection, None
+        if self._transaction is not None:
+            try:
+                if self._transaction.connection is connection:
+                    await self._cursor.close()
+            finally:
+                self._transaction._execute_lock.release()
+            return
+
+        try:
+            await self._cursor.close()
+            if self._commit:
+                await connection.commit()
+        finally:
+            if self._database is not None:
+                await self._database._close(connection)
 
 
 class Transaction(BaseTransaction, AsyncMySQLDatabase):
@@ -125,6 +210,19 @@ class Transaction(BaseTransaction, AsyncMySQLDatabase):
 
         self.connection = None
 
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        if self.connection is None:
+            await self.begin()
+
+        await self._execute_lock.acquire()
+        try:
+            cursor = self.connection.cursor(tormysql.SSCursor)
+            await cursor.execute(sql, params or ())
+        except:
+            self._execute_lock.release()
+            raise
+        return StreamCursor(self.connection, cursor, transaction=self)
+
 
 class MySQLDatabase(AsyncMySQLDatabase):
     commit_select = True
@@ -136,10 +234,19 @@ class MySQLDatabase(AsyncMySQLDatabase):
         kwargs["thread_safe"] = False
         self._closed = True
         self._conn_pool = None
+        self.autocommit = bool(kwargs.pop("autocommit", False))
+        if kwargs.pop("prepared_statement_cache_size", 0):
+            raise NotImplementedError("prepared_statement_cache_size is only supported by PostgreSQL databases")
+        self.coalesce_selects = bool(kwargs.pop("coalesce_selects", False))
+        self.implicit_transactions = bool(kwargs.pop("implicit_transactions", False))
+        self.statement_timeout = kwargs.pop("statement_timeout", None)
+        self._pool_health = PoolHealth(self, kwargs.pop("health_check_interval", None),
+                                       kwargs.pop("max_lifetime", None))
+        self._metrics = PoolMetrics()
 
         super(MySQLDatabase, self).__init__(*args, **kwargs)
 
-        self.connect_params["autocommit"] = False
+        self.connect_params["autocommit"] = self.autocommit
 
     def is_closed(self):
         return self._closed
@@ -161,6 +268,7 @@ class MySQLDatabase(AsyncMySQLDatabase):
                                 'opening a connection.')
 
             if not self._closed and self._conn_pool:
+                self._pool_health.stop()
                 self._conn_pool.close()
                 self._closed = True
                 return True
@@ -170,9 +278,44 @@ class MySQLDatabase(AsyncMySQLDatabase):
         if self.is_closed():
             self.connect()
             self._closed = False
-        conn = await self._conn_pool.Connection()
+        pool_info = self._pool_info()
+        start_time = self._metrics.start_acquire(pool_info["idle"] == 0 and pool_info["size"] >= pool_info["max_size"])
+        conn = None
+        try:
+            conn = await self._conn_pool.Connection()
+        finally:
+            self._metrics.on_acquire(conn, start_time)
+        self._pool_health.on_acquire(conn)
         return conn
 
+    async def _acquire_idle(self):
+        if self.is_closed() or self._conn_pool is None or not self._conn_pool._connections:
+            return None
+        conn = self._conn_pool._connections.popleft()
+        self._conn_pool._used_connections[id(conn)] = conn
+        conn.used_time = time.time()
+        return conn
+
+    def _pool_info(self):
+        if self.is_closed() or self._conn_pool is None:
+            return {"size": 0, "idle": 0, "max_size": self.connect_params.get("max_connections", 32)}
+        return {
+            "size": self._conn_pool._connections_count,
+            "idle": len(self._conn_pool._connections),
+            "max_size": self._conn_pool._max_connections,
+        }
+
+    def pool_stats(self):
+        stats = self._pool_info()
+        stats.update(self._metrics.as_dict())
+        return stats
+
+    def add_hook(self, event, callback):
+        self._metrics.add_hook(event, callback)
+
+    def remove_hook(self, event, callback):
+        self._metrics.remove_hook(event, callback)
+
     def connect(self, reuse_if_open=False):
         with self._lock:
             if self.deferred:
@@ -184,31 +327,102 @@ class MySQLDatabase(AsyncMySQLDatabase):
         return True
 
     def in_transaction(self):
-        return False
+        return get_current_transaction(self) is not None
+
+    def savepoint(self, sid=None):
+        transaction = get_current_transaction(self)
+        if transaction is None:
+            return super(MySQLDatabase, self).savepoint(sid)
+        return transaction.savepoint(sid)
 
     async def execute_sql(self, sql, params=None, commit=SENTINEL):
+        transaction = get_current_transaction(self)
+        if transaction is not None:
+            return await transaction.execute_sql(sql, params, commit=commit)
+
         if commit is SENTINEL:
-            if self.commit_select:
+            if self.autocommit:
+                commit = False
+            elif self.commit_select:
                 commit = True
             else:
                 commit = not sql[:6].lower().startswith('select')
 
+        timeout = get_statement_timeout(self)
+        if timeout:
+            sql = add_max_execution_time(sql, timeout)
+
         conn = await self.connection()
         try:
+            return await execute_cancellable(self, conn, self._execute_sql(conn, sql, params, commit), timeout)
+        except Exception as e:
+            if not is_read_sql(sql) or not self.is_connection_error(e):
+                raise
+            self._metrics.on_read_retry(sql, params, e)
+
+        conn = await self.connection()
+        return await execute_cancellable(self, conn, self._execute_sql(conn, sql, params, commit), timeout)
+
+    async def _execute_sql(self, conn, sql, params, commit):
+        discard = False
+        try:
+            start_time = time.time()
             cursor = conn.cursor()
             await cursor.execute(sql, params or ())
             await cursor.close()
-        except Exception:
-            if self.autorollback:
+            self._metrics.on_query(sql, params, start_time, cursor.rowcount)
+        except asyncio.CancelledError:
+            discard = True
+            raise
+        except Exception as e:
+            self._metrics.on_error(sql, params, e)
+            discard = self.is_connection_error(e)
+            if self.autorollback and not self.autocommit and not discard:
                 await conn.rollback()
             raise
         else:
             if commit:
                 await conn.commit()
+                self._metrics.on_commit()
         finally:
-            await self._close(conn)
+            await self._close(conn, discard)
         return cursor
 
+    async def _cancel_query(self, conn, task):
+        conn._torpeewee_cancelling = cancelling = asyncio.get_event_loop().create_future()
+        try:
+            killer = await tormysql.Client(*self._conn_pool._args, **self._conn_pool._kwargs).connect()
+            try:
+                if not task.done():
+                    cursor = killer.cursor()
+                    await cursor.execute("KILL QUERY %s", (conn.thread_id(),))
+                    await cursor.close()
+            finally:
+                await killer.close()
+        finally:
+            cancelling.set_result(None)
+
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        transaction = get_current_transaction(self)
+        if transaction is not None:
+            return await transaction.stream_sql(sql, params, commit=commit)
+
+        if commit is SENTINEL:
+            commit = self.commit_select and not self.autocommit
+
+        conn = await self.connection()
+        try:
+            cursor = conn.cursor(tormysql.SSCursor)
+            await cursor.execute(sql, params or ())
+        except Exception:
+            try:
+                if self.autorollback and not self.autocommit:
+                    await conn.rollback()
+            finally:
+                await self._close(conn)
+            raise
+        return StreamCursor(conn, cursor, self, commit)
+
     async def cursor(self, commit=None):
         conn = await self.connection()
         return conn.cursor()
@@ -219,5 +433,40 @@ class MySQLDatabase(AsyncMySQLDatabase):
     def commit_on_success(self, func):
         return self.transaction()(func)
 
-    async def _close(self, conn):
-        await conn.close()
+    async def run_in_transaction(self, func, retries=3, backoff=0.05):
+        return await run_in_transaction(self, func, retries, backoff)
+
+    def retry_transaction(self, retries=3, backoff=0.05, args_name="transaction"):
+        return retry_transaction(self, retries, backoff, args_name)
+
+    async def _close(self, conn, discard=False):
+        cancelling = getattr(conn, "_torpeewee_cancelling", None)
+        if cancelling is not None:
+            await cancelling
+            discard = True
+        self._metrics.on_release(conn)
+        if self._pool_health.is_expired(conn):
+            self._metrics.on_recycle()
+            discard = True
+        if not discard:
+            return await conn.close()
+
+        self._pool_health.forget(conn)
+        future = conn.close(True)
+        if future is not None:
+            await future
+
+    def _connection_key(self, conn):
+        return conn
+
+    async def _ping(self, conn):
+        await conn.ping(False)
+
+    def is_connection_error(self, e):
+        if InterfaceError is not None and isinstance(e, InterfaceError):
+            return True
+        return MySQLError is not None and isinstance(e, MySQLError) and bool(e.args) \
+               and e.args[0] in CONNECTION_ERRORS
+
+    async def warmup(self, min_size=1):
+        return await warmup(self, min_size)
@@ -2,14 +2,61 @@
 # 16/6/28
 # create by: snower
 
-from peewee import PostgresqlDatabase as BasePostgresqlDatabase, IndexMetadata, ViewMetadata, ColumnMetadata, ForeignKeyMetadata, sort_models, SENTINEL
-from .transaction import Atomic, Transaction as BaseTransaction
+import re
+import time
+import uuid
+import inspect
+import asyncio
+import warnings
+from functools import lru_cache
+from peewee import PostgresqlDatabase as BasePostgresqlDatabase, IndexMetadata, ViewMetadata, ColumnMetadata, ForeignKeyMetadata, SENTINEL
+from .transaction import Atomic, Transaction as BaseTransaction, get_current_transaction, run_in_transaction, \
+    retry_transaction
+from .statement import StatementCache, StatementStats, can_prepare
+from .bulk import BulkInsert, AsyncpgCopy, copy_fields, iter_copy_rows
+from .metrics import PoolMetrics
+from .model import sort_model_levels
+from .timeout import get_statement_timeout, get_local_statement_timeout, execute_cancellable
+from .health import PoolHealth, warmup
+from .replication import is_read_sql
 
 try:
     import aiopg
+    import psycopg2
 except ImportError:
     aiopg = None
 
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+
+PARAM_RE = re.compile(r"%%|%s")
+STATEMENT_RE = re.compile(r"\s*(\w+)")
+NO_ROWS_STATEMENTS = {"insert", "update", "delete", "create", "drop", "alter", "truncate", "comment", "grant", "revoke"}
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+@lru_cache(maxsize=1024)
+def translate_params(sql):
+    index = [0]
+
+    def replace(match):
+        if match.group(0) == "%%":
+            return "%"
+        index[0] += 1
+        return "$%d" % index[0]
+    return PARAM_RE.sub(replace, sql)
+
+
+@lru_cache(maxsize=1024)
+def returns_rows(sql):
+    match = STATEMENT_RE.match(sql)
+    if match is None or match.group(1).lower() not in NO_ROWS_STATEMENTS:
+        return True
+    return " RETURNING " in sql.upper()
+
 
 class AsyncPostgresqlDatabase(BasePostgresqlDatabase):
     def begin(self):
@@ -51,6 +98,9 @@ class AsyncPostgresqlDatabase(BasePostgresqlDatabase):
     def atomic(self, *args, **kwargs):
         return Atomic(self, *args, **kwargs)
 
+    def is_retryable_error(self, e):
+        return (getattr(e, "pgcode", None) or getattr(e, "sqlstate", None)) in RETRYABLE_SQLSTATES
+
     async def table_exists(self, table_name, schema=None):
         return table_name in (await self.get_tables(schema=schema))
 
@@ -143,13 +193,35 @@ class AsyncPostgresqlDatabase(BasePostgresqlDatabase):
                 AND relname=%s""", (sequence,))
         return bool(res.fetchone()[0])
 
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        raise NotImplementedError
+
+    async def stream(self, query, **context_options):
+        ctx = self.get_sql_context(**context_options)
+        sql, params = ctx.sql(query).query()
+        return await self.stream_sql(sql, params)
+
+    async def copy_from(self, model, rows, fields=None, batch_size=1000):
+        warnings.warn("aiopg connections can not run COPY, copy_from falls back to batched INSERT, "
+                      "use AsyncpgDatabase for COPY", RuntimeWarning, stacklevel=2)
+        fields = copy_fields(model, fields)
+        return await BulkInsert(model, self, fields, batch_size).execute(iter_copy_rows(rows, fields, False))
+
     async def create_tables(self, models, **options):
-        for model in sort_models(models):
-            await model.create_table(**options)
+        for level in sort_model_levels(models):
+            if self.in_transaction():
+                for model in level:
+                    await model.create_table(**options)
+            else:
+                await asyncio.gather(*[model.create_table(**options) for model in level])
 
     async def drop_tables(self, models, **kwargs):
-        for model in reversed(sort_models(models)):
-            await model.drop_table(**kwargs)
+        for level in reversed(sort_model_levels(models)):
+            if self.in_transaction():
+                for model in reversed(level):
+                    await model.drop_table(**kwargs)
+            else:
+                await asyncio.gather(*[model.drop_table(**kwargs) for model in level])
 
 
 class Cursor(object):
@@ -191,6 +263,62 @@ class Cursor(object):
         return getattr(self._cursor, item)
 
 
+class StreamCursor(object):
+    def __init__(self, connection, cursor, name, database=None, aiopg_transaction=None, transaction=None):
+        self._connection = connection
+        self._cursor = cursor
+        self._name = name
+        self._database = database
+        self._aiopg_transaction = aiopg_transaction
+        self._transaction = transaction
+        self.description = None
+
+    @classmethod
+    async def declare(cls, cursor, sql, params=None):
+        name = "torpeewee_stream_" + uuid.uuid4().hex
+        await cursor.execute('DECLARE "' + name + '" NO SCROLL CURSOR FOR ' + sql, params or ())
+        return name
+
+    async def fetchmany(self, size=None):
+        sql = 'FETCH FORWARD %d FROM "%s"' % (size or self._cursor.arraysize, self._name)
+        if self._transaction is not None:
+            async with self._transaction._execute_lock:
+                await self._cursor.execute(sql)
+        else:
+            await self._cursor.execute(sql)
+        self.description = self._cursor.description
+        return Cursor(self._cursor).fetchall()
+
+    async def close(self):
+        if self._connection is None:
+            return
+
+        connection, self._connection = self._connection, None
+        if self._transaction is not None:
+            try:
+                if self._transaction.connection is connection:
+                    async with self._transaction._execute_lock:
+                        await self._cursor.execute('CLOSE "%s"' % self._name)
+            finally:
+                self._cursor.close()
+            return
+
+        try:
+            try:
+                await self._cursor.execute('CLOSE "%s"' % self._name)
+            except Exception:
+                if self._aiopg_transaction is not None:
+                    await self._aiopg_transaction.rollback()
+                raise
+            else:
+                if self._aiopg_transaction is not None:
+                    await self._aiopg_transaction.commit()
+        finally:
+            if self._database is not None:
+                self._cursor.close()
+                await self._database._close(connection)
+
+
 class Transaction(BaseTransaction, AsyncPostgresqlDatabase):
     def __init__(self, database, args_name):
         AsyncPostgresqlDatabase.__init__(self, database.database)
@@ -200,14 +328,29 @@ class Transaction(BaseTransaction, AsyncPostgresqlDatabase):
         self.cursor = None
         self.aiopg_transaction = None
 
-    async def execute_sql(self, sql, params=None, commit=SENTINEL):
+    async def _execute_sql(self, sql, params=None):
         if self.connection is None:
             await self.begin()
 
+        start_time = time.time()
         cursor = await self.connection.cursor()
-        await cursor.execute(sql, params or ())
+        try:
+            await cursor.execute(sql, params or ())
+        except Exception as e:
+            self.database._metrics.on_error(sql, params, e)
+            raise
+        self.database._metrics.on_query(sql, params, start_time, cursor.rowcount)
         return Cursor(cursor)
 
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        if self.connection is None:
+            await self.begin()
+
+        cursor = await self.connection.cursor()
+        async with self._execute_lock:
+            name = await StreamCursor.declare(cursor, sql, params)
+        return StreamCursor(self.connection, cursor, name, transaction=self)
+
     async def begin(self):
         self.connection = await self.database.connection()
         try:
@@ -216,12 +359,14 @@ class Transaction(BaseTransaction, AsyncPostgresqlDatabase):
         except:
             await self.close()
             raise
+        self.bind()
         return self
 
     async def commit(self):
         if self.connection:
             await self.aiopg_transaction.commit()
             await self.close()
+            await self.flush_pending_tables()
 
     async def rollback(self):
         if self.connection:
@@ -229,6 +374,7 @@ class Transaction(BaseTransaction, AsyncPostgresqlDatabase):
             await self.close()
 
     async def close(self):
+        self.unbind()
         if self.connection:
             if self.cursor:
                 self.cursor.close()
@@ -247,6 +393,15 @@ class PostgresqlDatabase(AsyncPostgresqlDatabase):
         kwargs["thread_safe"] = False
         self._closed = True
         self._conn_pool = None
+        self.autocommit = bool(kwargs.pop("autocommit", False))
+        self.prepared_statement_cache_size = kwargs.pop("prepared_statement_cache_size", 0)
+        self.coalesce_selects = bool(kwargs.pop("coalesce_selects", False))
+        self.implicit_transactions = bool(kwargs.pop("implicit_transactions", False))
+        self.statement_timeout = kwargs.pop("statement_timeout", None)
+        self._pool_health = PoolHealth(self, kwargs.pop("health_check_interval", None),
+                                       kwargs.pop("max_lifetime", None))
+        self._statement_stats = StatementStats()
+        self._metrics = PoolMetrics()
 
         super(PostgresqlDatabase, self).__init__(*args, **kwargs)
 
@@ -265,6 +420,9 @@ class PostgresqlDatabase(AsyncPostgresqlDatabase):
             conn_kwargs["database"] = conn_kwargs.pop("db")
         if "maxsize" not in conn_kwargs:
             conn_kwargs["maxsize"] = 32
+        if self.statement_timeout:
+            conn_kwargs["options"] = ("%s -c statement_timeout=%d" % (conn_kwargs.get("options", ""),
+                                                                      int(self.statement_timeout * 1000))).strip()
         return aiopg.create_pool(None, **conn_kwargs)
 
     def close(self):
@@ -274,6 +432,7 @@ class PostgresqlDatabase(AsyncPostgresqlDatabase):
                                 'before closing connection')
 
             if not self._closed and self._conn_pool:
+                self._pool_health.stop()
                 self._conn_pool.close()
                 self._closed = True
                 return True
@@ -294,46 +453,175 @@ class PostgresqlDatabase(AsyncPostgresqlDatabase):
             self.connect()
             self._conn_pool = await self._conn_pool
             self._closed = False
-        conn = await self._conn_pool.acquire()
+        pool_info = self._pool_info()
+        start_time = self._metrics.start_acquire(pool_info["idle"] == 0 and pool_info["size"] >= pool_info["max_size"])
+        conn = None
+        try:
+            conn = await self._conn_pool.acquire()
+        finally:
+            self._metrics.on_acquire(conn, start_time)
+        self._pool_health.on_acquire(conn)
         return conn
 
+    async def _acquire_idle(self):
+        if self.is_closed() or self._conn_pool is None or not self._conn_pool.freesize:
+            return None
+        return await self._conn_pool.acquire()
+
+    def _pool_info(self):
+        if self.is_closed() or self._conn_pool is None:
+            return {"size": 0, "idle": 0, "max_size": self.connect_params.get("maxsize", 32)}
+        return {
+            "size": self._conn_pool.size,
+            "idle": self._conn_pool.freesize,
+            "max_size": self._conn_pool.maxsize,
+        }
+
+    def pool_stats(self):
+        stats = self._pool_info()
+        stats.update(self._metrics.as_dict())
+        return stats
+
+    def add_hook(self, event, callback):
+        self._metrics.add_hook(event, callback)
+
+    def remove_hook(self, event, callback):
+        self._metrics.remove_hook(event, callback)
+
     def in_transaction(self):
-        return False
+        return get_current_transaction(self) is not None
+
+    def savepoint(self, sid=None):
+        transaction = get_current_transaction(self)
+        if transaction is None:
+            return super(PostgresqlDatabase, self).savepoint(sid)
+        return transaction.savepoint(sid)
 
     async def execute_sql(self, sql, params=None, commit=SENTINEL):
+        transaction = get_current_transaction(self)
+        if transaction is not None:
+            return await transaction.execute_sql(sql, params, commit=commit)
+
         if commit is SENTINEL:
-            if self.commit_select:
+            if self.autocommit:
+                commit = False
+            elif self.commit_select:
                 commit = True
             else:
                 commit = not sql[:6].lower().startswith('select')
 
-        if self.autorollback or commit:
-            conn = await self.connection()
+        timeout, local_timeout = get_statement_timeout(self), get_local_statement_timeout(self)
+        conn = await self.connection()
+        try:
+            return await execute_cancellable(self, conn, self._execute_sql(conn, sql, params, commit, local_timeout),
+                                             timeout)
+        except Exception as e:
+            if not is_read_sql(sql) or not self.is_connection_error(e):
+                raise
+            self._metrics.on_read_retry(sql, params, e)
+
+        conn = await self.connection()
+        return await execute_cancellable(self, conn, self._execute_sql(conn, sql, params, commit, local_timeout),
+                                         timeout)
+
+    async def _execute_sql(self, conn, sql, params, commit, timeout=None):
+        discard = False
+        in_transaction = not self.autocommit and (self.autorollback or commit)
+        if in_transaction or timeout:
             try:
                 cursor = await conn.cursor()
                 transaction = await cursor.begin()
                 try:
+                    if timeout:
+                        await cursor.execute("SET LOCAL statement_timeout = %d" % max(int(timeout * 1000), 1))
+                    start_time = time.time()
                     cursor = await conn.cursor()
-                    await cursor.execute(sql, params or ())
-                except Exception:
-                    if self.autorollback:
+                    await self._execute_cursor(conn, cursor, sql, params)
+                    self._metrics.on_query(sql, params, start_time, cursor.rowcount)
+                except asyncio.CancelledError:
+                    discard = True
+                    raise
+                except Exception as e:
+                    self._metrics.on_error(sql, params, e)
+                    discard = self.is_connection_error(e)
+                    if (self.autorollback or not in_transaction) and not discard:
                         await transaction.rollback()
                     raise
                 else:
-                    if commit:
+                    if commit or not in_transaction:
                         await transaction.commit()
+                        self._metrics.on_commit()
             finally:
-                await self._close(conn)
+                await self._close(conn, discard)
             return Cursor(cursor)
 
-        conn = await self.connection()
         try:
+            start_time = time.time()
             cursor = await conn.cursor()
-            await cursor.execute(sql, params or ())
+            await self._execute_cursor(conn, cursor, sql, params)
+            self._metrics.on_query(sql, params, start_time, cursor.rowcount)
+        except asyncio.CancelledError:
+            discard = True
+            raise
+        except Exception as e:
+            self._metrics.on_error(sql, params, e)
+            discard = self.is_connection_error(e)
+            raise
         finally:
-            await self._close(conn)
+            await self._close(conn, discard)
         return Cursor(cursor)
 
+    async def _cancel_query(self, conn, task):
+        conn._torpeewee_cancelling = cancelling = asyncio.get_event_loop().create_future()
+        try:
+            if not task.done():
+                await asyncio.get_event_loop().run_in_executor(None, conn.raw.cancel)
+        finally:
+            conn._torpeewee_cancelling = None
+            cancelling.set_result(None)
+
+    async def _execute_cursor(self, conn, cursor, sql, params=None):
+        if not self.prepared_statement_cache_size or not can_prepare(sql):
+            return await cursor.execute(sql, params or ())
+
+        cache = StatementCache.get_cache(conn, self.prepared_statement_cache_size, self._statement_stats)
+        name = cache.get(sql)
+        if name is None:
+            name, evicted_name = cache.put(sql)
+            if evicted_name is not None:
+                await cursor.execute("DEALLOCATE " + evicted_name)
+            try:
+                await cursor.execute("PREPARE " + name + " AS " + translate_params(sql))
+            except Exception:
+                cache.remove(sql)
+                raise
+
+        if not params:
+            return await cursor.execute("EXECUTE " + name)
+        return await cursor.execute("EXECUTE " + name + " (" + ", ".join(["%s"] * len(params)) + ")", params)
+
+    def prepared_statement_stats(self):
+        return self._statement_stats.as_dict()
+
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        transaction = get_current_transaction(self)
+        if transaction is not None:
+            return await transaction.stream_sql(sql, params, commit=commit)
+
+        conn = await self.connection()
+        try:
+            cursor = await conn.cursor()
+            transaction = await cursor.begin()
+            try:
+                name = await StreamCursor.declare(cursor, sql, params)
+            except Exception:
+                await transaction.rollback()
+                raise
+        except Exception:
+            await self._close(conn)
+            raise
+        return StreamCursor(conn, cursor, name, self, transaction)
+
     async def cursor(self, commit=None):
         conn = await self.connection()
         return conn.cursor()
@@ -344,5 +632,401 @@ class PostgresqlDatabase(AsyncPostgresqlDatabase):
     def commit_on_success(self, func):
         return self.transaction()(func)
 
-    async def _close(self, conn):
+    async def run_in_transaction(self, func, retries=3, backoff=0.05):
+        return await run_in_transaction(self, func, retries, backoff)
+
+    def retry_transaction(self, retries=3, backoff=0.05, args_name="transaction"):
+        return retry_transaction(self, retries, backoff, args_name)
+
+    async def _close(self, conn, discard=False):
+        cancelling = getattr(conn, "_torpeewee_cancelling", None)
+        if cancelling is not None:
+            await cancelling
+        self._metrics.on_release(conn)
+        if self._pool_health.is_expired(conn):
+            self._metrics.on_recycle()
+            discard = True
+        if discard:
+            self._pool_health.forget(conn)
+            result = conn.close()
+            if inspect.isawaitable(result):
+                await result
         await self._conn_pool.release(conn)
+
+    def _connection_key(self, conn):
+        return conn
+
+    async def _ping(self, conn):
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
+
+    def is_connection_error(self, e):
+        return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) and not getattr(e, "pgcode", None)
+
+    async def warmup(self, min_size=1):
+        return await warmup(self, min_size)
+
+
+class AsyncpgCursor(object):
+    def __init__(self, records=None, status=None):
+        self._records = records or []
+        self._index = 0
+        self.arraysize = 1
+        self.lastrowid = None
+
+        if self._records:
+            self.description = [(key,) for key in self._records[0].keys()]
+        else:
+            self.description = []
+
+        if status:
+            count = status.rsplit(" ", 1)[-1]
+            self.rowcount = int(count) if count.isdigit() else -1
+        else:
+            self.rowcount = len(self._records)
+
+    @classmethod
+    async def execute(cls, connection, sql, params=None):
+        if returns_rows(sql):
+            return cls(await connection.fetch(translate_params(sql), *(params or ())))
+        return cls(status=await connection.execute(translate_params(sql), *(params or ())))
+
+    def fetchone(self):
+        if self._index >= len(self._records):
+            return None
+        record = self._records[self._index]
+        self._index += 1
+        return tuple(record)
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        records = self._records[self._index: self._index + size]
+        self._index += len(records)
+        return [tuple(record) for record in records]
+
+    def fetchall(self):
+        records = self._records[self._index:]
+        self._index = len(self._records)
+        return [tuple(record) for record in records]
+
+    def close(self):
+        pass
+
+
+class AsyncpgStreamCursor(object):
+    def __init__(self, connection, cursor, database=None, asyncpg_transaction=None):
+        self._connection = connection
+        self._cursor = cursor
+        self._database = database
+        self._asyncpg_transaction = asyncpg_transaction
+        self.description = None
+
+    async def fetchmany(self, size=None):
+        records = await self._cursor.fetch(size or 1)
+        if records and self.description is None:
+            self.description = [(key,) for key in records[0].keys()]
+        return [tuple(record) for record in records]
+
+    async def close(self):
+        if self._connection is None:
+            return
+
+        connection, self._connection = self._connection, None
+        try:
+            if self._asyncpg_transaction is not None:
+                await self._asyncpg_transaction.commit()
+        finally:
+            if self._database is not None:
+                await self._database._close(connection)
+
+
+class AsyncpgTransaction(BaseTransaction, AsyncPostgresqlDatabase):
+    def __init__(self, database, args_name):
+        AsyncPostgresqlDatabase.__init__(self, database.database)
+        BaseTransaction.__init__(self, database, args_name)
+
+        self.connection = None
+        self.asyncpg_transaction = None
+
+    async def _execute_sql(self, sql, params=None):
+        if self.connection is None:
+            await self.begin()
+
+        start_time = time.time()
+        try:
+            cursor = await AsyncpgCursor.execute(self.connection, sql, params)
+        except Exception as e:
+            self.database._metrics.on_error(sql, params, e)
+            raise
+        self.database._metrics.on_query(sql, params, start_time, cursor.rowcount)
+        return cursor
+
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        if self.connection is None:
+            await self.begin()
+
+        cursor = await self.connection.cursor(translate_params(sql), *(params or ()))
+        return AsyncpgStreamCursor(self.connection, cursor)
+
+    async def copy_from(self, model, rows, fields=None, batch_size=None):
+        if self.connection is None:
+            await self.begin()
+
+        return await AsyncpgCopy(model, fields).execute(self.connection, rows)
+
+    async def begin(self):
+        self.connection = await self.database.connection()
+        try:
+            self.asyncpg_transaction = self.connection.transaction()
+            await self.asyncpg_transaction.start()
+        except:
+            await self.close()
+            raise
+        self.bind()
+        return self
+
+    async def commit(self):
+        if self.connection:
+            await self.asyncpg_transaction.commit()
+            await self.close()
+            await self.flush_pending_tables()
+
+    async def rollback(self):
+        if self.connection:
+            await self.asyncpg_transaction.rollback()
+            await self.close()
+
+    async def close(self):
+        self.unbind()
+        if self.connection:
+            await self.database._close(self.connection)
+            self.connection = None
+            self.asyncpg_transaction = None
+
+
+class AsyncpgDatabase(AsyncPostgresqlDatabase):
+    def __init__(self, *args, **kwargs):
+        if asyncpg is None or asyncpg.__version__ < '0.24.0':
+            raise ImportError("use AsyncpgDatabase require install asyncpg>=0.24.0")
+
+        kwargs["thread_safe"] = False
+        self._closed = True
+        self._conn_pool = None
+        self.prepared_statement_cache_size = kwargs.pop("prepared_statement_cache_size", None)
+        self.coalesce_selects = bool(kwargs.pop("coalesce_selects", False))
+        self.implicit_transactions = bool(kwargs.pop("implicit_transactions", False))
+        self.statement_timeout = kwargs.pop("statement_timeout", None)
+        self._pool_health = PoolHealth(self, kwargs.pop("health_check_interval", None),
+                                       kwargs.pop("max_lifetime", None))
+        self._metrics = PoolMetrics()
+
+        super(AsyncpgDatabase, self).__init__(*args, **kwargs)
+
+    def is_closed(self):
+        return self._closed
+
+    def _connect(self):
+        conn_kwargs = {
+            "database": self.database,
+        }
+
+        conn_kwargs.update(self.connect_params)
+        if 'passwd' in conn_kwargs:
+            conn_kwargs['password'] = conn_kwargs.pop('passwd')
+        if "db" in conn_kwargs:
+            conn_kwargs["database"] = conn_kwargs.pop("db")
+        if "minsize" in conn_kwargs:
+            conn_kwargs["min_size"] = conn_kwargs.pop("minsize")
+        if "maxsize" in conn_kwargs:
+            conn_kwargs["max_size"] = conn_kwargs.pop("maxsize")
+        if "max_size" not in conn_kwargs:
+            conn_kwargs["max_size"] = 32
+        if self.prepared_statement_cache_size is not None:
+            conn_kwargs["statement_cache_size"] = self.prepared_statement_cache_size
+        if self.statement_timeout:
+            conn_kwargs["server_settings"] = dict(conn_kwargs.get("server_settings") or {},
+                                                  statement_timeout=str(int(self.statement_timeout * 1000)))
+        conn_kwargs["min_size"] = min(conn_kwargs.get("min_size", 1), conn_kwargs["max_size"])
+        return asyncpg.create_pool(**conn_kwargs)
+
+    def close(self):
+        with self._lock:
+            if self.deferred:
+                raise Exception('Error, database not properly initialized '
+                                'before closing connection')
+
+            if not self._closed and self._conn_pool:
+                self._pool_health.stop()
+                asyncio.ensure_future(self._conn_pool.close())
+                self._closed = True
+                return True
+            return False
+
+    def connect(self, reuse_if_open=False):
+        with self._lock:
+            if self.deferred:
+                raise Exception('Error, database must be initialized before '
+                                'opening a connection.')
+
+            self._conn_pool = self._connect()
+            self._initialize_connection(self._conn_pool)
+        return True
+
+    async def connection(self):
+        if self.is_closed():
+            self.connect()
+            self._conn_pool = await self._conn_pool
+            self._closed = False
+        pool_info = self._pool_info()
+        start_time = self._metrics.start_acquire(pool_info["idle"] == 0 and pool_info["size"] >= pool_info["max_size"])
+        conn = None
+        try:
+            conn = await self._conn_pool.acquire()
+        finally:
+            self._metrics.on_acquire(conn, start_time)
+        self._pool_health.on_acquire(conn)
+        return conn
+
+    async def _acquire_idle(self):
+        if self.is_closed() or self._conn_pool is None or not self._conn_pool.get_idle_size():
+            return None
+        return await self._conn_pool.acquire()
+
+    def _pool_info(self):
+        if self.is_closed() or self._conn_pool is None:
+            return {"size": 0, "idle": 0,
+                    "max_size": self.connect_params.get("max_size", self.connect_params.get("maxsize", 32))}
+        return {
+            "size": self._conn_pool.get_size(),
+            "idle": self._conn_pool.get_idle_size(),
+            "max_size": self._conn_pool.get_max_size(),
+        }
+
+    def pool_stats(self):
+        stats = self._pool_info()
+        stats.update(self._metrics.as_dict())
+        return stats
+
+    def add_hook(self, event, callback):
+        self._metrics.add_hook(event, callback)
+
+    def remove_hook(self, event, callback):
+        self._metrics.remove_hook(event, callback)
+
+    def in_transaction(self):
+        return get_current_transaction(self) is not None
+
+    def savepoint(self, sid=None):
+        transaction = get_current_transaction(self)
+        if transaction is None:
+            return super(AsyncpgDatabase, self).savepoint(sid)
+        return transaction.savepoint(sid)
+
+    async def execute_sql(self, sql, params=None, commit=SENTINEL):
+        transaction = get_current_transaction(self)
+        if transaction is not None:
+            return await transaction.execute_sql(sql, params, commit=commit)
+
+        timeout, local_timeout = get_statement_timeout(self), get_local_statement_timeout(self)
+        conn = await self.connection()
+        try:
+            return await execute_cancellable(self, conn, self._execute_sql(conn, sql, params, local_timeout), timeout)
+        except Exception as e:
+            if not is_read_sql(sql) or not self.is_connection_error(e):
+                raise
+            self._metrics.on_read_retry(sql, params, e)
+
+        conn = await self.connection()
+        return await execute_cancellable(self, conn, self._execute_sql(conn, sql, params, local_timeout), timeout)
+
+    async def _execute_sql(self, conn, sql, params, timeout=None):
+        discard = False
+        try:
+            start_time = time.time()
+            if timeout:
+                async with conn.transaction():
+                    await conn.execute("SET LOCAL statement_timeout = %d" % max(int(timeout * 1000), 1))
+                    cursor = await AsyncpgCursor.execute(conn, sql, params)
+            else:
+                cursor = await AsyncpgCursor.execute(conn, sql, params)
+            self._metrics.on_query(sql, params, start_time, cursor.rowcount)
+            return cursor
+        except Exception as e:
+            self._metrics.on_error(sql, params, e)
+            discard = self.is_connection_error(e)
+            raise
+        finally:
+            await self._close(conn, discard)
+
+    async def _cancel_query(self, conn, task):
+        task.cancel()
+
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        transaction = get_current_transaction(self)
+        if transaction is not None:
+            return await transaction.stream_sql(sql, params, commit=commit)
+
+        conn = await self.connection()
+        try:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                cursor = await conn.cursor(translate_params(sql), *(params or ()))
+            except Exception:
+                await transaction.rollback()
+                raise
+        except Exception:
+            await self._close(conn)
+            raise
+        return AsyncpgStreamCursor(conn, cursor, self, transaction)
+
+    async def copy_from(self, model, rows, fields=None, batch_size=None):
+        transaction = get_current_transaction(self)
+        if transaction is not None:
+            return await transaction.copy_from(model, rows, fields, batch_size)
+
+        conn = await self.connection()
+        try:
+            return await AsyncpgCopy(model, fields).execute(conn, rows)
+        finally:
+            await self._close(conn)
+
+    async def cursor(self, commit=None):
+        raise NotImplementedError
+
+    def transaction(self, args_name="transaction"):
+        return AsyncpgTransaction(self, args_name)
+
+    def commit_on_success(self, func):
+        return self.transaction()(func)
+
+    async def run_in_transaction(self, func, retries=3, backoff=0.05):
+        return await run_in_transaction(self, func, retries, backoff)
+
+    def retry_transaction(self, retries=3, backoff=0.05, args_name="transaction"):
+        return retry_transaction(self, retries, backoff, args_name)
+
+    async def _close(self, conn, discard=False):
+        self._metrics.on_release(conn)
+        if self._pool_health.is_expired(conn):
+            self._metrics.on_recycle()
+            discard = True
+        if discard:
+            self._pool_health.forget(conn)
+            conn.terminate()
+        await self._conn_pool.release(conn)
+
+    def _connection_key(self, conn):
+        return getattr(conn, "_con", None) or conn
+
+    async def _ping(self, conn):
+        await conn.fetchval("SELECT 1")
+
+    def is_connection_error(self, e):
+        return isinstance(e, (asyncpg.ConnectionDoesNotExistError, asyncpg.PostgresConnectionError, ConnectionError))
+
+    async def warmup(self, min_size=1):
+        return await warmup(self, min_size)
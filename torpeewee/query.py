@@ -2,9 +2,16 @@
 # 16/6/28
 # create by: snower
 
-from peewee import database_required, SQL, fn, Select as BaseSelect
+import asyncio
+from collections import deque
+from peewee import database_required, SQL, fn, Node, Select as BaseSelect, ColumnBase, _WriteQuery, prefetch_add_subquery
 from peewee import ModelSelect as BaseModelSelect, NoopModelSelect as BaseNoopModelSelect, ModelUpdate as BaseModelUpdate, \
     ModelInsert as BaseModelInsert, ModelDelete as BaseModelDelete, ModelRaw as BaseModelRaw
+from .cache import query_cache, query_singleflight, invalidate_tables
+from .identity import get_identity_map
+from .keyset import keyset_orderings, keyset_expression, keyset_values, encode_token, decode_token
+from .timeout import statement_timeout
+from .transaction import find_transaction
 
 
 class AsyncQueryIter(object):
@@ -28,13 +35,193 @@ class AsyncQueryIter(object):
         return value
 
 
+class StreamRowsCursor(object):
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.rows = deque()
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def fetchone(self):
+        if self.rows:
+            return self.rows.popleft()
+        return None
+
+    def close(self):
+        pass
+
+
+class AsyncStreamQueryIter(object):
+    def __init__(self, query, database, batch_size=1000):
+        self._query = query
+        self._database = database
+        self._batch_size = batch_size
+        self._rows_cursor = None
+        self._cursor_wrapper = None
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+
+        if self._rows_cursor is None:
+            cursor = await self._database.stream(self._query)
+            self._rows_cursor = StreamRowsCursor(cursor)
+            self._cursor_wrapper = self._query._get_cursor_wrapper(self._rows_cursor)
+
+        if not self._rows_cursor.rows:
+            try:
+                rows = await self._rows_cursor.cursor.fetchmany(self._batch_size)
+            except:
+                await self.close()
+                raise
+            if not rows:
+                await self.close()
+                raise StopAsyncIteration
+            self._rows_cursor.rows.extend(rows)
+        return self._cursor_wrapper.iterate(False)
+
+    async def close(self):
+        self._closed = True
+        if self._rows_cursor is not None:
+            rows_cursor, self._rows_cursor = self._rows_cursor, None
+            rows_cursor.rows.clear()
+            await rows_cursor.cursor.close()
+
+    async def aclose(self):
+        await self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __del__(self):
+        if self._rows_cursor is not None:
+            asyncio.ensure_future(self.close())
+
+
+class ParamValue(object):
+    def __init__(self, name, converter=None):
+        self.name = name
+        self.converter = converter
+
+    def bind(self, params):
+        value = params[self.name]
+        if self.converter:
+            return self.converter(value)
+        return value
+
+
+class Param(ColumnBase):
+    def __init__(self, name, converter=None):
+        self.name = name
+        self.converter = converter
+
+    def __sql__(self, ctx):
+        return ctx.value(ParamValue(self.name, self.converter or ctx.state.converter), converter=False)
+
+
+class CompiledQuery(object):
+    def __init__(self, query, database, sql=None, params=None):
+        self.query = query
+        self.database = database
+        if sql is None:
+            sql, params = database.get_sql_context().sql(query).query()
+        self.sql = sql
+        self.params = params
+
+    def bind(self, database):
+        return CompiledQuery(self.query, database, self.sql, self.params)
+
+    def bind_params(self, params):
+        return [param.bind(params) if isinstance(param, ParamValue) else param
+                for param in self.params]
+
+    async def execute(self, **params):
+        cursor = await self.database.execute_sql(self.sql, self.bind_params(params))
+        if not isinstance(self.query, _WriteQuery):
+            return self.query._get_cursor_wrapper(cursor)
+        await invalidate_tables([self.query.model._meta.table_name], find_transaction(self.database))
+        if self.query._returning:
+            cursor = self.query._get_cursor_wrapper(cursor)
+        return self.query.handle_result(self.database, cursor)
+
+    __call__ = execute
+
+
+async def prefetch(sq, *subqueries, database=None):
+    if not subqueries:
+        return list(await sq.execute(database))
+
+    fixed_queries = prefetch_add_subquery(sq, subqueries)
+    databases = [database or pq.query._database or pq.model._meta.database for pq in fixed_queries]
+    if any(query_database.in_transaction() for query_database in databases):
+        results = [await pq.query.execute(query_database) for pq, query_database in zip(fixed_queries, databases)]
+    else:
+        results = await asyncio.gather(*[pq.query.execute(query_database)
+                                         for pq, query_database in zip(fixed_queries, databases)])
+
+    deps = {}
+    rel_map = {}
+    for pq, result in reversed(list(zip(fixed_queries, results))):
+        query_model = pq.model
+        if pq.fields:
+            for rel_model in pq.rel_models:
+                rel_map.setdefault(rel_model, [])
+                rel_map[rel_model].append(pq)
+
+        deps.setdefault(query_model, {})
+        id_map = deps[query_model]
+        has_relations = bool(rel_map.get(query_model))
+
+        for instance in result:
+            if pq.fields:
+                pq.store_instance(instance, id_map)
+            if has_relations:
+                for rel in rel_map[query_model]:
+                    rel.populate_instance(instance, deps[rel.model])
+
+    return list(results[0])
+
+
 class Select(BaseSelect):
+    _cache_ttl = None
+    _query_cache = None
+    _coalesce = None
+
+    @database_required
+    async def execute(self, database, timeout=None):
+        with statement_timeout(timeout):
+            return await self._execute(database)
+
     async def _execute(self, database):
         if self._cursor_wrapper is None:
-            cursor = await database.execute(self)
+            if self._cache_ttl is not None and not database.in_transaction():
+                cursor = await (self._query_cache or query_cache).execute(database, self, self._cache_ttl)
+            elif (self._coalesce if self._coalesce is not None else getattr(database, "coalesce_selects", False)) \
+                    and not database.in_transaction():
+                cursor = await query_singleflight.execute(database, self)
+            else:
+                cursor = await database.execute(self)
             self._cursor_wrapper = self._get_cursor_wrapper(cursor)
         return self._cursor_wrapper
 
+    @Node.copy
+    def cached(self, ttl=60, cache=None):
+        self._cache_ttl = ttl
+        self._query_cache = cache
+
+    @Node.copy
+    def coalesce(self, coalesce=True):
+        self._coalesce = coalesce
+
     @database_required
     async def peek(self, database, n=1):
         rows = (await self._execute(database))[:n]
@@ -65,7 +252,12 @@ class Select(BaseSelect):
                 clone = clone.select(SQL('1'))
         except AttributeError:
             pass
-        return Select([clone], [fn.COUNT(SQL('1'))]).scalar(database)
+        query = Select([clone], [fn.COUNT(SQL('1'))])
+        if self._cache_ttl is not None:
+            query = query.cached(self._cache_ttl, self._query_cache)
+        if self._coalesce is not None:
+            query = query.coalesce(self._coalesce)
+        return query.scalar(database)
 
     @database_required
     async def exists(self, database):
@@ -122,18 +314,50 @@ class Select(BaseSelect):
     def __aiter__(self):
         return AsyncQueryIter(self)
 
+    @database_required
+    def stream(self, database, batch_size=1000):
+        return AsyncStreamQueryIter(self, database, batch_size)
+
+    @database_required
+    def compile(self, database):
+        return CompiledQuery(self, database)
+
     def __await__(self):
         coroutine = self._ensure_execution()
         return coroutine.__await__()
 
 
 class ModelSelect(BaseModelSelect):
+    _cache_ttl = None
+    _query_cache = None
+    _coalesce = None
+
+    @database_required
+    async def execute(self, database, timeout=None):
+        with statement_timeout(timeout):
+            return await self._execute(database)
+
     async def _execute(self, database):
         if self._cursor_wrapper is None:
-            cursor = await database.execute(self)
+            if self._cache_ttl is not None and not database.in_transaction():
+                cursor = await (self._query_cache or query_cache).execute(database, self, self._cache_ttl)
+            elif (self._coalesce if self._coalesce is not None else getattr(database, "coalesce_selects", False)) \
+                    and not database.in_transaction():
+                cursor = await query_singleflight.execute(database, self)
+            else:
+                cursor = await database.execute(self)
             self._cursor_wrapper = self._get_cursor_wrapper(cursor)
         return self._cursor_wrapper
 
+    @Node.copy
+    def cached(self, ttl=60, cache=None):
+        self._cache_ttl = ttl
+        self._query_cache = cache
+
+    @Node.copy
+    def coalesce(self, coalesce=True):
+        self._coalesce = coalesce
+
     @database_required
     async def peek(self, database, n=1):
         rows = (await self._execute(database))[:n]
@@ -164,7 +388,12 @@ class ModelSelect(BaseModelSelect):
                 clone = clone.select(SQL('1'))
         except AttributeError:
             pass
-        return Select([clone], [fn.COUNT(SQL('1'))]).scalar(database)
+        query = Select([clone], [fn.COUNT(SQL('1'))])
+        if self._cache_ttl is not None:
+            query = query.cached(self._cache_ttl, self._query_cache)
+        if self._coalesce is not None:
+            query = query.coalesce(self._coalesce)
+        return query.scalar(database)
 
     @database_required
     async def exists(self, database):
@@ -174,15 +403,24 @@ class ModelSelect(BaseModelSelect):
         return bool((await clone.scalar()))
 
     async def get(self, database=None):
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            instance = identity_map.get_query(self, database)
+            if instance is not None:
+                return instance
+
         clone = self.paginate(1, 1)
         clone._cursor_wrapper = None
         try:
-            return await clone.execute(database)[0]
+            instance = (await clone.execute(database))[0]
         except IndexError:
             sql, params = clone.sql()
             raise self.model.DoesNotExist('%s instance matching query does '
                                           'not exist:\nSQL: %s\nParams: %s' %
                                           (clone.model, sql, params))
+        if identity_map is not None and isinstance(instance, self.model):
+            return identity_map.add(instance, database=database or self._database)
+        return instance
 
     async def iterator(self, database=None):
         return iter((await self.execute(database)).iterator())
@@ -224,18 +462,77 @@ class ModelSelect(BaseModelSelect):
     def __aiter__(self):
         return AsyncQueryIter(self)
 
+    async def keyset_paginate(self, order_by=None, after=None, limit=20, database=None):
+        orderings = keyset_orderings(self.model, order_by)
+        query = self.order_by(*[field.desc() if desc else field.asc() for field, desc in orderings]) \
+            .limit(limit).offset(None)
+        if after is not None:
+            values = decode_token(after)
+            if len(values) != len(orderings):
+                raise ValueError("Keyset token does not match the ordering.")
+            query = query.where(keyset_expression(orderings, values))
+
+        rows = list(await query.execute(database))
+        if len(rows) < limit:
+            return rows, None
+        return rows, encode_token(keyset_values(rows[-1], orderings, query._returning))
+
+    async def iter_keyset(self, batch_size=1000, order_by=None, database=None):
+        after = None
+        while True:
+            rows, after = await self.keyset_paginate(order_by, after, batch_size, database)
+            for row in rows:
+                yield row
+            if after is None:
+                return
+
+    async def prefetch(self, *subqueries, database=None):
+        return await prefetch(self, *subqueries, database=database)
+
+    @database_required
+    def stream(self, database, batch_size=1000):
+        return AsyncStreamQueryIter(self, database, batch_size)
+
+    @database_required
+    def compile(self, database):
+        return CompiledQuery(self, database)
+
     def __await__(self):
         coroutine = self.execute()
         return coroutine.__await__()
 
 
 class NoopModelSelect(BaseNoopModelSelect):
+    _cache_ttl = None
+    _query_cache = None
+    _coalesce = None
+
+    @database_required
+    async def execute(self, database, timeout=None):
+        with statement_timeout(timeout):
+            return await self._execute(database)
+
     async def _execute(self, database):
         if self._cursor_wrapper is None:
-            cursor = await database.execute(self)
+            if self._cache_ttl is not None and not database.in_transaction():
+                cursor = await (self._query_cache or query_cache).execute(database, self, self._cache_ttl)
+            elif (self._coalesce if self._coalesce is not None else getattr(database, "coalesce_selects", False)) \
+                    and not database.in_transaction():
+                cursor = await query_singleflight.execute(database, self)
+            else:
+                cursor = await database.execute(self)
             self._cursor_wrapper = self._get_cursor_wrapper(cursor)
         return self._cursor_wrapper
 
+    @Node.copy
+    def cached(self, ttl=60, cache=None):
+        self._cache_ttl = ttl
+        self._query_cache = cache
+
+    @Node.copy
+    def coalesce(self, coalesce=True):
+        self._coalesce = coalesce
+
     @database_required
     async def peek(self, database, n=1):
         rows = (await self._execute(database))[:n]
@@ -266,7 +563,12 @@ class NoopModelSelect(BaseNoopModelSelect):
                 clone = clone.select(SQL('1'))
         except AttributeError:
             pass
-        return Select([clone], [fn.COUNT(SQL('1'))]).scalar(database)
+        query = Select([clone], [fn.COUNT(SQL('1'))])
+        if self._cache_ttl is not None:
+            query = query.cached(self._cache_ttl, self._query_cache)
+        if self._coalesce is not None:
+            query = query.coalesce(self._coalesce)
+        return query.scalar(database)
 
     @database_required
     async def exists(self, database):
@@ -326,6 +628,14 @@ class NoopModelSelect(BaseNoopModelSelect):
     def __aiter__(self):
         return AsyncQueryIter(self)
 
+    @database_required
+    def stream(self, database, batch_size=1000):
+        return AsyncStreamQueryIter(self, database, batch_size)
+
+    @database_required
+    def compile(self, database):
+        return CompiledQuery(self, database)
+
     def __await__(self):
         coroutine = self.execute()
         return coroutine.__await__()
@@ -338,11 +648,20 @@ class ModelUpdate(BaseModelUpdate):
                 raise ValueError('Query has not been executed.')
             await self.execute()
 
+    @database_required
+    async def execute(self, database, timeout=None):
+        with statement_timeout(timeout):
+            return await self._execute(database)
+
     async def _execute(self, database):
         if self._returning:
             cursor = await self.execute_returning(database)
         else:
             cursor = await database.execute(self)
+        await invalidate_tables([self.model._meta.table_name], find_transaction(database))
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.remove_query(self)
         return self.handle_result(database, cursor)
 
     async def execute_returning(self, database):
@@ -351,6 +670,10 @@ class ModelUpdate(BaseModelUpdate):
             self._cursor_wrapper = self._get_cursor_wrapper(cursor)
         return self._cursor_wrapper
 
+    @database_required
+    def compile(self, database):
+        return CompiledQuery(self, database)
+
     async def iterator(self, database=None):
         return iter((await self.execute(database)).iterator())
 
@@ -369,11 +692,17 @@ class ModelInsert(BaseModelInsert):
                 raise ValueError('Query has not been executed.')
             await self.execute()
 
+    @database_required
+    async def execute(self, database, timeout=None):
+        with statement_timeout(timeout):
+            return await self._execute(database)
+
     async def _execute(self, database):
         if self._returning:
             cursor = await self.execute_returning(database)
         else:
             cursor = await database.execute(self)
+        await invalidate_tables([self.model._meta.table_name], find_transaction(database))
         return self.handle_result(database, cursor)
 
     async def execute_returning(self, database):
@@ -382,6 +711,10 @@ class ModelInsert(BaseModelInsert):
             self._cursor_wrapper = self._get_cursor_wrapper(cursor)
         return self._cursor_wrapper
 
+    @database_required
+    def compile(self, database):
+        return CompiledQuery(self, database)
+
     async def iterator(self, database=None):
         return iter((await self.execute(database)).iterator())
 
@@ -400,11 +733,20 @@ class ModelDelete(BaseModelDelete):
                 raise ValueError('Query has not been executed.')
             await self.execute()
 
+    @database_required
+    async def execute(self, database, timeout=None):
+        with statement_timeout(timeout):
+            return await self._execute(database)
+
     async def _execute(self, database):
         if self._returning:
             cursor = await self.execute_returning(database)
         else:
             cursor = await database.execute(self)
+        await invalidate_tables([self.model._meta.table_name], find_transaction(database))
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.remove_query(self)
         return self.handle_result(database, cursor)
 
     async def execute_returning(self, database):
@@ -413,6 +755,10 @@ class ModelDelete(BaseModelDelete):
             self._cursor_wrapper = self._get_cursor_wrapper(cursor)
         return self._cursor_wrapper
 
+    @database_required
+    def compile(self, database):
+        return CompiledQuery(self, database)
+
     async def iterator(self, database=None):
         return iter((await self.execute(database)).iterator())
 
@@ -431,6 +777,11 @@ class ModelRaw(BaseModelRaw):
                 raise ValueError('Query has not been executed.')
             await self.execute()
 
+    @database_required
+    async def execute(self, database, timeout=None):
+        with statement_timeout(timeout):
+            return await self._execute(database)
+
     async def _execute(self, database):
         if self._cursor_wrapper is None:
             cursor = await database.execute(self)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import re
+import time
+import weakref
+import asyncio
+from functools import lru_cache
+from peewee import SENTINEL
+from .transaction import Atomic, run_in_transaction, retry_transaction
+
+READ_RE = re.compile(r"\s*select\b", re.I)
+PRIMARY_SELECT_RE = re.compile(r"\bfor\s+(update|share|no\s+key\s+update|key\s+share)\b|\block\s+in\s+share\s+mode\b"
+                               r"|\b(nextval|setval|last_insert_id|get_lock|release_lock)\s*\(", re.I)
+BALANCES = ("round_robin", "least_outstanding")
+
+
+@lru_cache(maxsize=1024)
+def is_read_sql(sql):
+    return READ_RE.match(sql) is not None and PRIMARY_SELECT_RE.search(sql) is None
+
+
+def current_task():
+    try:
+        if hasattr(asyncio, "current_task"):
+            return asyncio.current_task()
+        return asyncio.Task.current_task()
+    except RuntimeError:
+        return None
+
+
+class ReplicatedDatabase(object):
+    def __init__(self, primary, replicas=None, balance="round_robin", sticky_time=1):
+        if balance not in BALANCES:
+            raise ValueError('Unknown balance "%s", must be one of %s.' % (balance, ", ".join(BALANCES)))
+
+        self.primary = primary
+        self.replicas = list(replicas or [])
+        self.balance = balance
+        self.sticky_time = sticky_time
+        self._index = 0
+        self._outstanding = [0] * len(self.replicas)
+        self._sticky_tasks = weakref.WeakKeyDictionary()
+
+    def __getattr__(self, key):
+        return getattr(self.primary, key)
+
+    def stick(self):
+        task = current_task()
+        if task is not None and self.sticky_time:
+            self._sticky_tasks[task] = time.time() + self.sticky_time
+
+    def is_sticky(self):
+        task = current_task()
+        if task is None or task not in self._sticky_tasks:
+            return False
+        if self._sticky_tasks[task] < time.time():
+            del self._sticky_tasks[task]
+            return False
+        return True
+
+    def get_replica_index(self):
+        if not self.replicas or self.is_sticky() or self.primary.in_transaction():
+            return None
+
+        if self.balance == "least_outstanding":
+            count = len(self.replicas)
+            index = min(range(self._index, self._index + count), key=lambda i: self._outstanding[i % count]) % count
+            self._index = (index + 1) % count
+            return index
+
+        index = self._index % len(self.replicas)
+        self._index = (index + 1) % len(self.replicas)
+        return index
+
+    async def _execute_replica(self, method, sql, *args, **kwargs):
+        index = self.get_replica_index()
+        if index is None:
+            return await getattr(self.primary, method)(sql, *args, **kwargs)
+
+        self._outstanding[index] += 1
+        try:
+            return await getattr(self.replicas[index], method)(sql, *args, **kwargs)
+        finally:
+            self._outstanding[index] -= 1
+
+    def execute(self, query, commit=SENTINEL, **context_options):
+        ctx = self.get_sql_context(**context_options)
+        sql, params = ctx.sql(query).query()
+        return self.execute_sql(sql, params, commit=commit)
+
+    async def execute_sql(self, sql, params=None, commit=SENTINEL):
+        if is_read_sql(sql):
+            return await self._execute_replica("execute_sql", sql, params, commit=commit)
+
+        self.stick()
+        return await self.primary.execute_sql(sql, params, commit=commit)
+
+    async def stream(self, query, **context_options):
+        ctx = self.get_sql_context(**context_options)
+        sql, params = ctx.sql(query).query()
+        return await self.stream_sql(sql, params)
+
+    async def stream_sql(self, sql, params=None, commit=SENTINEL):
+        if is_read_sql(sql):
+            return await self._execute_replica("stream_sql", sql, params, commit=commit)
+
+        self.stick()
+        return await self.primary.stream_sql(sql, params, commit=commit)
+
+    async def copy_from(self, model, rows, fields=None, **kwargs):
+        self.stick()
+        return await self.primary.copy_from(model, rows, fields, **kwargs)
+
+    def transaction(self, *args, **kwargs):
+        self.stick()
+        return self.primary.transaction(*args, **kwargs)
+
+    def atomic(self, *args, **kwargs):
+        return Atomic(self, *args, **kwargs)
+
+    def commit_on_success(self, func):
+        return self.transaction()(func)
+
+    async def run_in_transaction(self, func, retries=3, backoff=0.05):
+        return await run_in_transaction(self, func, retries, backoff)
+
+    def retry_transaction(self, retries=3, backoff=0.05, args_name="transaction"):
+        return retry_transaction(self, retries, backoff, args_name)
+
+    async def warmup(self, min_size=1):
+        return sum(await asyncio.gather(*[database.warmup(min_size) for database in [self.primary] + self.replicas]))
+
+    def close(self):
+        closed = False
+        for database in [self.primary] + self.replicas:
+            closed = database.close() or closed
+        return closed
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import heapq
+import zlib
+import asyncio
+from collections import deque
+from itertools import islice
+from peewee import SENTINEL, OP, Expression, Function, Ordering, Alias, Field, Insert, SelectBase, NodeList, SQL
+from .transaction import Atomic
+from .bulk import BulkInsert
+
+AGGREGATES = {"COUNT": sum, "SUM": sum, "MIN": min, "MAX": max}
+UNMERGEABLE_AGGREGATES = {"AVG", "GROUP_CONCAT", "STRING_AGG", "ARRAY_AGG", "JSON_AGG", "JSONB_AGG", "JSON_ARRAYAGG",
+                          "JSON_OBJECTAGG", "STDDEV", "STDDEV_POP", "STDDEV_SAMP", "VARIANCE", "VAR_POP", "VAR_SAMP",
+                          "BIT_AND", "BIT_OR", "BIT_XOR", "BOOL_AND", "BOOL_OR", "EVERY", "MEDIAN", "MODE",
+                          "PERCENTILE_CONT", "PERCENTILE_DISC"}
+
+
+def default_shard_func(value, count):
+    if isinstance(value, int):
+        return value % count
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8")
+    return zlib.crc32(value) % count
+
+
+def find_aggregates(node):
+    node = node.unwrap() if hasattr(node, "unwrap") else node
+    if isinstance(node, Function):
+        if node.name.upper() in AGGREGATES or node.name.upper() in UNMERGEABLE_AGGREGATES:
+            return [node]
+        return [aggregate for argument in node.arguments for aggregate in find_aggregates(argument)]
+    if isinstance(node, Expression):
+        return find_aggregates(node.lhs) + find_aggregates(node.rhs)
+    if isinstance(node, NodeList):
+        return [aggregate for child in node.nodes for aggregate in find_aggregates(child)]
+    return []
+
+
+def is_distinct(node):
+    if isinstance(node, Function):
+        return node.name.upper() == "DISTINCT"
+    if isinstance(node, NodeList) and node.nodes:
+        return isinstance(node.nodes[0], SQL) and node.nodes[0].sql.upper() == "DISTINCT"
+    return False
+
+
+def is_simple_distinct(query):
+    distinct = getattr(query, "_distinct", None)
+    return bool(getattr(query, "_simple_distinct", None)) or (distinct is not None and not distinct)
+
+
+class SortKey(object):
+    __slots__ = ("values", "reverses")
+
+    def __init__(self, values, reverses):
+        self.values = values
+        self.reverses = reverses
+
+    def __lt__(self, other):
+        for value, other_value, reverse in zip(self.values, other.values, self.reverses):
+            if value == other_value:
+                continue
+            if value is None:
+                result = True
+            elif other_value is None:
+                result = False
+            else:
+                result = value < other_value
+            return not result if reverse else result
+        return False
+
+
+class ShardedCursor(object):
+    def __init__(self, cursors, rows=None):
+        self.cursors = cursors
+        self.description = next((cursor.description for cursor in cursors if cursor.description), None)
+        self.rowcount = sum(cursor.rowcount for cursor in cursors if cursor.rowcount and cursor.rowcount > 0)
+        self.lastrowid = None
+        for cursor in cursors:
+            if getattr(cursor, "lastrowid", None):
+                self.lastrowid = cursor.lastrowid
+        if rows is None:
+            rows = [row for cursor in cursors for row in cursor.fetchall()]
+        self.rows = deque(rows)
+
+    def fetchone(self):
+        if self.rows:
+            return self.rows.popleft()
+        return None
+
+    def fetchmany(self, size=None):
+        return [self.rows.popleft() for _ in range(min(size or 1, len(self.rows)))]
+
+    def fetchall(self):
+        rows, self.rows = list(self.rows), deque()
+        return rows
+
+    def close(self):
+        pass
+
+
+class ShardedStreamCursor(object):
+    def __init__(self, databases, query, cursor):
+        self._databases = deque(databases)
+        self._query = query
+        self._cursor = cursor
+        self.description = cursor.description
+
+    async def fetchmany(self, size=None):
+        while self._cursor is not None:
+            rows = await self._cursor.fetchmany(size)
+            if rows:
+                return rows
+            cursor, self._cursor = self._cursor, None
+            await cursor.close()
+            if self._databases:
+                self._cursor = await self._databases.popleft().stream(self._query)
+        return []
+
+    async def close(self):
+        self._databases.clear()
+        if self._cursor is not None:
+            cursor, self._cursor = self._cursor, None
+            await cursor.close()
+
+
+class ShardedDatabase(object):
+    def __init__(self, shards):
+        self.shards = list(shards)
+
+    def __getattr__(self, key):
+        return getattr(self.shards[0], key)
+
+    def get_shard_field(self, model):
+        shard_key = getattr(model._meta, "shard_key", None)
+        if isinstance(shard_key, str):
+            return model._meta.fields[shard_key]
+        return shard_key
+
+    def get_shard_index(self, model, value):
+        shard_func = getattr(model._meta, "shard_func", None) or default_shard_func
+        return shard_func(value, len(self.shards)) % len(self.shards)
+
+    def get_shard(self, model, value):
+        return self.shards[self.get_shard_index(model, value)]
+
+    def route_expression(self, model, field, node):
+        if not isinstance(node, Expression):
+            return None
+        if node.op == OP.AND:
+            lhs, rhs = self.route_expression(model, field, node.lhs), self.route_expression(model, field, node.rhs)
+            if lhs is None or rhs is None:
+                return lhs if rhs is None else rhs
+            return lhs & rhs
+        if node.op == OP.OR:
+            lhs, rhs = self.route_expression(model, field, node.lhs), self.route_expression(model, field, node.rhs)
+            if lhs is None or rhs is None:
+                return None
+            return lhs | rhs
+        if not isinstance(node.lhs, Field) or node.lhs.model is not model or node.lhs.name != field.name:
+            return None
+        if node.op == OP.EQ:
+            return {self.get_shard_index(model, node.rhs)}
+        if node.op == OP.IN and isinstance(node.rhs, (list, tuple, set, frozenset)):
+            return {self.get_shard_index(model, value) for value in node.rhs}
+        return None
+
+    def route_query(self, query):
+        model = getattr(query, "model", None)
+        if model is None:
+            for source in getattr(query, "_from_list", None) or ():
+                if isinstance(source, SelectBase):
+                    return self.route_query(source)
+            return None
+
+        field = self.get_shard_field(model)
+        if field is None or getattr(query, "_where", None) is None:
+            return None
+        indexes = self.route_expression(model, field, query._where)
+        return sorted(indexes) if indexes is not None else None
+
+    def get_column_index(self, query, cursor, node):
+        for index, column in enumerate(getattr(query, "_returning", None) or ()):
+            if column is node or (isinstance(column, Alias) and column.node is node):
+                return index
+        name = getattr(node, "column_name", None) or getattr(node, "_alias", None)
+        for index, column in enumerate(cursor.description or ()):
+            if column[0] == name:
+                return index
+        raise ValueError('Sharded query order by column "%s" must be selected.' % (name or node))
+
+    def get_aggregates(self, query):
+        if getattr(query, "_group_by", None) or getattr(query, "_having", None) is not None:
+            raise NotImplementedError("Sharded query can not merge GROUP BY results across shards.")
+        if getattr(query, "_windows", None) or getattr(query, "_distinct", None):
+            raise NotImplementedError("Sharded query can not merge window or DISTINCT ON results across shards.")
+
+        columns = getattr(query, "_returning", None) or ()
+        if not any(find_aggregates(column) for column in columns):
+            return None
+
+        aggregates = []
+        for column in columns:
+            column = column.unwrap()
+            name = column.name.upper() if isinstance(column, Function) else None
+            nodes = find_aggregates(column)
+            if name not in AGGREGATES or len(nodes) != 1 or nodes[0] is not column:
+                raise NotImplementedError('Sharded query can not merge column "%s" across shards.'
+                                          % (name or getattr(column, "name", None) or column))
+            if any(is_distinct(argument) for argument in column.arguments):
+                raise NotImplementedError("Sharded query can not merge %s(DISTINCT) across shards." % name)
+            aggregates.append(AGGREGATES[name])
+
+        for source in getattr(query, "_from_list", None) or ():
+            if not isinstance(source, SelectBase):
+                continue
+            if getattr(source, "_limit", None) is not None or getattr(source, "_offset", None) \
+                    or is_simple_distinct(source):
+                raise NotImplementedError("Sharded query can not merge aggregates over LIMIT or DISTINCT subqueries.")
+            self.get_aggregates(source)
+        return aggregates
+
+    def merge_aggregates(self, aggregates, cursors):
+        rows = [row for cursor in cursors for row in cursor.fetchall()]
+        if not rows:
+            return []
+
+        merged_row = []
+        for index, aggregate in enumerate(aggregates):
+            values = [row[index] for row in rows if row[index] is not None]
+            merged_row.append(aggregate(values) if values else None)
+        return [tuple(merged_row)]
+
+    def merge_distinct(self, rows):
+        seen = set()
+        for row in rows:
+            key = tuple(row)
+            if key not in seen:
+                seen.add(key)
+                yield row
+
+    def merge_ordered(self, query, cursors):
+        if not getattr(query, "_order_by", None):
+            return None
+
+        cursor = next((cursor for cursor in cursors if cursor.description), cursors[0])
+        indexes, reverses = [], []
+        for node in query._order_by:
+            if isinstance(node, Ordering):
+                indexes.append(self.get_column_index(query, cursor, node.node))
+                reverses.append(node.direction.upper() == "DESC")
+            else:
+                indexes.append(self.get_column_index(query, cursor, node))
+                reverses.append(False)
+
+        return heapq.merge(*[cursor.fetchall() for cursor in cursors],
+                           key=lambda row: SortKey([row[index] for index in indexes], reverses))
+
+    async def execute_select(self, query, indexes, commit=SENTINEL, **context_options):
+        limit, offset = getattr(query, "_limit", None), getattr(query, "_offset", None) or 0
+        shard_query = query
+        if limit is not None or offset:
+            shard_query = query.clone()
+            shard_query._limit = limit + offset if limit is not None else None
+            shard_query._offset = None
+
+        aggregates = self.get_aggregates(query)
+        cursors = await asyncio.gather(*[self.shards[index].execute(shard_query, commit=commit, **context_options)
+                                         for index in indexes])
+        if aggregates is not None:
+            return ShardedCursor(cursors, self.merge_aggregates(aggregates, cursors))
+
+        rows = self.merge_ordered(query, cursors)
+        if rows is None:
+            rows = (row for cursor in cursors for row in cursor.fetchall())
+        if is_simple_distinct(query):
+            rows = self.merge_distinct(rows)
+        return ShardedCursor(cursors, list(islice(rows, offset, offset + limit if limit is not None else None)))
+
+    async def execute_insert(self, query, commit=SENTINEL, **context_options):
+        field = self.get_shard_field(query.model)
+        if field is None:
+            raise ValueError('Model "%s" has no shard_key.' % query.model.__name__)
+
+        if isinstance(query._insert, dict):
+            value = query._insert.get(field, query._insert.get(field.name, SENTINEL))
+            if value is SENTINEL:
+                raise ValueError('Shard key "%s" is required to insert into a sharded model.' % field.name)
+            return await self.get_shard(query.model, value).execute(query, commit=commit, **context_options)
+
+        if isinstance(query._insert, SelectBase):
+            return ShardedCursor(await asyncio.gather(*[shard.execute(query, commit=commit, **context_options)
+                                                        for shard in self.shards]))
+
+        column_index = None
+        for index, column in enumerate(query._columns or ()):
+            if column is field or (isinstance(column, str) and column == field.name):
+                column_index = index
+
+        groups = {}
+        for row in query._insert:
+            if isinstance(row, dict):
+                value = row.get(field.name, row.get(field, SENTINEL))
+            else:
+                value = row[column_index] if column_index is not None else SENTINEL
+            if value is SENTINEL:
+                raise ValueError('Shard key "%s" is required to insert into a sharded model.' % field.name)
+            groups.setdefault(self.get_shard_index(query.model, value), []).append(row)
+
+        futures = []
+        for index, rows in sorted(groups.items()):
+            shard_query = query.clone()
+            shard_query._insert = rows
+            futures.append(self.shards[index].execute(shard_query, commit=commit, **context_options))
+        return ShardedCursor(await asyncio.gather(*futures))
+
+    async def execute(self, query, commit=SENTINEL, **context_options):
+        if isinstance(query, Insert):
+            return await self.execute_insert(query, commit=commit, **context_options)
+
+        indexes = self.route_query(query)
+        if indexes is not None and len(indexes) == 1:
+            return await self.shards[indexes[0]].execute(query, commit=commit, **context_options)
+        if indexes is None:
+            indexes = range(len(self.shards))
+
+        if isinstance(query, SelectBase):
+            return await self.execute_select(query, indexes, commit=commit, **context_options)
+        return ShardedCursor(await asyncio.gather(*[self.shards[index].execute(query, commit=commit, **context_options)
+                                                    for index in indexes]))
+
+    async def execute_sql(self, sql, params=None, commit=SENTINEL):
+        return ShardedCursor(await asyncio.gather(*[shard.execute_sql(sql, params, commit=commit)
+                                                    for shard in self.shards]))
+
+    async def stream(self, query, **context_options):
+        indexes = self.route_query(query)
+        if indexes is None:
+            indexes = range(len(self.shards))
+        databases = [self.shards[index] for index in indexes]
+        if len(databases) == 1:
+            return await databases[0].stream(query, **context_options)
+        return ShardedStreamCursor(databases[1:], query, await databases[0].stream(query, **context_options))
+
+    async def copy_from(self, model, rows, fields=None, batch_size=1000):
+        return await BulkInsert(model, self, fields, batch_size).execute(rows)
+
+    def transaction(self, *args, **kwargs):
+        raise NotImplementedError("Transactions can not span shards, use get_shard(model, value).transaction().")
+
+    def atomic(self, *args, **kwargs):
+        return Atomic(self, *args, **kwargs)
+
+    def commit_on_success(self, func):
+        return self.transaction()(func)
+
+    def run_in_transaction(self, *args, **kwargs):
+        raise NotImplementedError("Transactions can not span shards, use get_shard(model, value).run_in_transaction().")
+
+    def retry_transaction(self, *args, **kwargs):
+        raise NotImplementedError("Transactions can not span shards, use get_shard(model, value).retry_transaction().")
+
+    async def warmup(self, min_size=1):
+        return sum(await asyncio.gather(*[database.warmup(min_size) for database in self.shards]))
+
+    def close(self):
+        closed = False
+        for shard in self.shards:
+            closed = shard.close() or closed
+        return closed
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import re
+from collections import OrderedDict
+
+PREPARE_STATEMENTS = {"select", "insert", "update", "delete"}
+STATEMENT_RE = re.compile(r"\s*(\w+)")
+
+
+def can_prepare(sql):
+    match = STATEMENT_RE.match(sql)
+    return match is not None and match.group(1).lower() in PREPARE_STATEMENTS
+
+
+class StatementStats(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class StatementCache(object):
+    def __init__(self, size, stats=None):
+        self.size = size
+        self.stats = stats or StatementStats()
+        self.statements = OrderedDict()
+        self.index = 0
+
+    def get(self, sql):
+        name = self.statements.get(sql)
+        if name is None:
+            self.stats.misses += 1
+            return None
+        self.statements.move_to_end(sql)
+        self.stats.hits += 1
+        return name
+
+    def put(self, sql):
+        evicted_name = None
+        if len(self.statements) >= self.size:
+            _, evicted_name = self.statements.popitem(last=False)
+            self.stats.evictions += 1
+
+        self.index += 1
+        name = "torpeewee_stmt_%d" % self.index
+        self.statements[sql] = name
+        return name, evicted_name
+
+    def remove(self, sql):
+        return self.statements.pop(sql, None)
+
+    def __len__(self):
+        return len(self.statements)
+
+    @classmethod
+    def get_cache(cls, connection, size, stats):
+        cache = getattr(connection, "_torpeewee_statement_cache", None)
+        if cache is None:
+            cache = cls(size, stats)
+            connection._torpeewee_statement_cache = cache
+        return cache
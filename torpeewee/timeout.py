@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# 26/10/18
+# create by: snower
+
+import asyncio
+import contextvars
+
+current_statement_timeout = contextvars.ContextVar("torpeewee_statement_timeout", default=None)
+
+
+def get_statement_timeout(database):
+    timeout = current_statement_timeout.get()
+    if timeout is None:
+        timeout = getattr(database, "statement_timeout", None)
+    return timeout or None
+
+
+def get_local_statement_timeout(database):
+    timeout = current_statement_timeout.get()
+    if not timeout or timeout == getattr(database, "statement_timeout", None):
+        return None
+    return timeout
+
+
+class statement_timeout(object):
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._token = None
+
+    def __enter__(self):
+        if self.timeout is not None:
+            self._token = current_statement_timeout.set(self.timeout)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._token is not None:
+            current_statement_timeout.reset(self._token)
+            self._token = None
+
+
+async def cancel_query(database, conn, task):
+    if not task.done():
+        try:
+            await database._cancel_query(conn, task)
+        except Exception:
+            pass
+    try:
+        await task
+    except (Exception, asyncio.CancelledError):
+        pass
+
+
+async def execute_cancellable(database, conn, coroutine, timeout=None):
+    if not timeout:
+        try:
+            return await coroutine
+        except asyncio.CancelledError:
+            database._metrics.on_cancel(False)
+            raise
+
+    task = asyncio.ensure_future(coroutine)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        database._metrics.on_cancel(True)
+        await cancel_query(database, conn, task)
+        raise
+    except asyncio.CancelledError:
+        database._metrics.on_cancel(False)
+        asyncio.ensure_future(cancel_query(database, conn, task))
+        raise
@@ -3,9 +3,79 @@
 # create by: snower
 
 import sys
+import time
+import uuid
+import random
+import logging
+import contextvars
 from functools import wraps
 import asyncio
 from peewee import SENTINEL
+from .cache import invalidate_tables
+
+current_transactions = contextvars.ContextVar("torpeewee_transactions", default=None)
+
+
+def get_current_transaction(database):
+    transactions = current_transactions.get()
+    if not transactions:
+        return None
+    transaction = transactions.get(database)
+    if transaction is None or transaction.connection is None:
+        return None
+    return transaction
+
+
+def find_transaction(database):
+    if not database.in_transaction():
+        return None
+    transaction = get_current_transaction(database) or database
+    if getattr(transaction, "pending_tables", None) is None:
+        return None
+    return transaction
+
+
+async def run_in_transaction(database, func, retries=3, backoff=0.05, max_backoff=1, name=None):
+    if database.in_transaction():
+        return await func(database)
+
+    name = name or getattr(func, "__qualname__", None) or repr(func)
+    attempt = 0
+    while True:
+        transaction = await database.transaction().begin()
+        try:
+            result = await func(transaction)
+            await transaction.commit()
+            return result
+        except Exception as e:
+            try:
+                await transaction.rollback()
+            except Exception:
+                logging.getLogger("torpeewee").exception("rollback failed while handling %r", e)
+            finally:
+                await transaction.close()
+
+            if not database.is_retryable_error(e):
+                raise
+            if attempt >= retries:
+                database._metrics.on_retry_failure(name, attempt, e)
+                raise
+            attempt += 1
+            delay = random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+            database._metrics.on_retry(name, attempt, e, delay)
+            await asyncio.sleep(delay)
+
+
+def retry_transaction(database, retries=3, backoff=0.05, args_name="transaction"):
+    def decorator(func):
+        @wraps(func)
+        async def _(*args, **kwargs):
+            async def run(transaction):
+                kwargs[args_name] = transaction
+                return await func(*args, **kwargs)
+            return await run_in_transaction(database, run, retries, backoff, name=func.__qualname__)
+        return _
+    return decorator
 
 
 class Atomic(object):
@@ -21,18 +91,69 @@ class Atomic(object):
         raise NotImplementedError
 
     async def __aenter__(self):
+        if self.db.in_transaction():
+            self._transaction = await self.db.savepoint().begin()
+            return self
+
         args, kwargs = self._transaction_args
         self._transaction = self.db.transaction(*args, **kwargs)
+        await self._transaction.__aenter__()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         return await self._transaction.__aexit__(exc_type, exc_val, exc_tb)
 
+    def __getattr__(self, key):
+        return getattr(self.db if self._transaction is None else self._transaction, key)
+
+
+class Savepoint(object):
+    def __init__(self, transaction, sid=None):
+        self.transaction = transaction
+        self.sid = sid or "s" + uuid.uuid4().hex
+        self.quoted_sid = self.sid.join(transaction.quote)
+
+    async def begin(self):
+        await self.transaction.execute_sql("SAVEPOINT %s;" % self.quoted_sid)
+        return self
+
+    async def commit(self, begin=False):
+        await self.transaction.execute_sql("RELEASE SAVEPOINT %s;" % self.quoted_sid)
+        if begin:
+            await self.begin()
+
+    async def rollback(self):
+        await self.transaction.execute_sql("ROLLBACK TO SAVEPOINT %s;" % self.quoted_sid)
+
+    def __await__(self):
+        coroutine = self.begin()
+        return coroutine.__await__()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            await self.rollback()
+        else:
+            try:
+                await self.commit()
+            except:
+                exc_info = sys.exc_info()
+                await self.rollback()
+                raise exc_info[1].with_traceback(exc_info[2])
+
+    def __getattr__(self, key):
+        return getattr(self.transaction, key)
+
 
 class Transaction(object):
     def __init__(self, database, args_name):
         self.database = database
         self.args_name = args_name
+        self._token = None
+        self._execute_lock = asyncio.Lock()
+        self.pending_tables = set()
 
     def _connect(self, database, **kwargs):
         raise NotImplementedError
@@ -53,24 +174,60 @@ class Transaction(object):
     def in_transaction(self):
         return True
 
+    def savepoint(self, sid=None):
+        return Savepoint(self, sid)
+
+    async def flush_pending_tables(self):
+        if self.pending_tables:
+            tables, self.pending_tables = list(self.pending_tables), set()
+            await invalidate_tables(tables)
+
+    def bind(self):
+        if not getattr(self.database, "implicit_transactions", False) or self._token is not None:
+            return
+        transactions = dict(current_transactions.get() or {})
+        transactions[self.database] = self
+        self._token = current_transactions.set(transactions)
+
+    def unbind(self):
+        if self._token is None:
+            return
+        token, self._token = self._token, None
+        try:
+            current_transactions.reset(token)
+        except ValueError:
+            pass
+
     async def execute_sql(self, sql, params=None, commit=SENTINEL):
+        async with self._execute_lock:
+            return await self._execute_sql(sql, params)
+
+    async def _execute_sql(self, sql, params=None):
         if self.connection is None:
             await self.begin()
 
+        start_time = time.time()
         cursor = self.connection.cursor()
-        await cursor.execute(sql, params or ())
-        await cursor.close()
+        try:
+            await cursor.execute(sql, params or ())
+            await cursor.close()
+        except Exception as e:
+            self.database._metrics.on_error(sql, params, e)
+            raise
+        self.database._metrics.on_query(sql, params, start_time, cursor.rowcount)
         return cursor
 
     async def begin(self):
         self.connection = await self.database.connection()
         await self.connection.begin()
+        self.bind()
         return self
 
     async def commit(self):
         if self.connection:
             await self.connection.commit()
             await self.close()
+            await self.flush_pending_tables()
 
     async def rollback(self):
         if self.connection:
@@ -115,6 +272,8 @@ class Transaction(object):
                 raise exc_info[1].with_traceback(exc_info[2])
 
     async def __aenter__(self):
+        if self.connection is None and getattr(self.database, "implicit_transactions", False):
+            await self.begin()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -132,6 +291,7 @@ class Transaction(object):
                 raise exc_info[1].with_traceback(exc_info[2])
 
     async def close(self):
+        self.unbind()
         if self.connection:
             await self.database._close(self.connection)
             self.connection = None